@@ -12,11 +12,27 @@ import os  # the os module is used for file and directory operations
 from game_grid import GameGrid  # the class for modeling the game grid
 from tetromino import Tetromino  # the class for modeling the tetrominoes
 import random  # used for creating tetrominoes with random types (shapes)
+from game_random import GameRandom  # the generator of the random numbers
+import sys  # used for reading the command line arguments
+import simulation  # used for running headless games on all the cores
+import replay  # used for recording the games
+import frame_timing  # used for timing the phases of the frames
 
 # setting the is_paused, restart and speed of the game
 is_paused = False
 restart = False
 speed_game = 250
+# the tile value that wins the game (e.g. 4096 or 8192 for longer sessions)
+win_value = 2048
+# the random number generator of the current game (seeded with game_seed), the
+# number of frames of the current game and its replay recorder
+rng, game_seed, frame, recorder = random, None, 0, None
+# the directory where the replays of the games are saved (None for not
+# recording the games)
+replay_dir = None
+# the timer of the phases of the frames of the main game loop (it records
+# nothing unless the game is started with the profile command)
+frame_timer = frame_timing.NullPhaseTimer()
 
 
 # The main function where this program starts execution
@@ -25,6 +41,7 @@ def start():
     global is_paused
     global restart
     global score
+    global frame
     score = 0
     game_over = False
     # set the dimensions of the game grid
@@ -39,8 +56,10 @@ def start():
     # set the game grid dimension values stored and used in the Tetromino class
     Tetromino.grid_height = grid_h
     Tetromino.grid_width = grid_w
+    # seed the random number generator of the game
+    new_game(grid_h, grid_w)
     # create the game grid
-    grid = GameGrid(grid_h, grid_w)
+    grid = GameGrid(grid_h, grid_w, win_value=win_value)
     grid.score = score
     # create the first tetromino to enter the game grid
     # by using the create_tetromino function defined below
@@ -55,8 +74,9 @@ def start():
 
     # the main game loop
     while True:
-        # if the score
-        if grid.has_value(2048):
+        # if a tile reached the win value
+        if grid.has_won():
+            save_replay()
             condition = display_ending_menu(grid_h, grid_w, grid.score, "VİCTORY!")
             # if the condition is true that means restart the game is true
             if condition:
@@ -75,6 +95,7 @@ def start():
 
         # if the game is over
         if game_over:
+            save_replay()
             # displaying the ending menu
             condition = display_ending_menu(grid_h, grid_w, grid.score, "GAME OVER!")
             # if the condition is true that means restart the game is true
@@ -93,6 +114,7 @@ def start():
                 exit()
         # check if user paused the game and click restart
         if restart:
+            save_replay()
             # restart the game procedures
             is_paused = False
             restart = False
@@ -102,8 +124,12 @@ def start():
             display_game_menu(grid_h, grid_w)
             stddraw.clearKeysTyped()
 
+        frame_timer.begin_frame()
         if stddraw.hasNextKeyTyped():  # check if the user has pressed a key
             key_typed = stddraw.nextKeyTyped()
+            # record the key as an input of this frame
+            if recorder is not None:
+                recorder.record(frame, key_typed)
             if key_typed == "p":
                 is_paused = True
                 print("stopped")
@@ -127,17 +153,17 @@ def start():
                 current_tetromino.move("h", grid, True)
             # clear the queue of the pressed keys for a smoother interaction
             stddraw.clearKeysTyped()
+        frame_timer.lap("input")
 
         # move the active tetromino down by one at each iteration (auto fall)
         success = current_tetromino.move("down", grid, False)
+        frame_timer.lap("fall")
 
         # lock the active tetromino onto the grid when it cannot go down anymore
         if not success:
-            # get the tile matrix of the tetromino without empty rows and columns
-            # and the position of the bottom left cell in this matrix
-            tiles, pos = current_tetromino.get_min_bounded_tile_matrix(True)
             # update the game grid by locking the tiles of the landed tetromino
-            game_over = grid.update_grid(tiles, pos)
+            # (written straight from the cells of the tetromino)
+            game_over = grid.lock_tetromino(current_tetromino)
             # end the main game loop if the game is over
 
             # create the next tetromino to enter the game grid
@@ -146,15 +172,74 @@ def start():
             grid.current_tetromino = next_tetromino
             next_tetromino = create_tetromino()
             grid.next_tetromino = next_tetromino
+        frame_timer.lap("lock")
 
-        # if it is not paused and not restart, display the grid
+        # if it is not paused and not restart, display the grid and wait for
+        # the duration of a frame (set by the speed of the game)
         if not is_paused or not restart:
-            grid.display(speed_game)
+            grid.display(0)
+            frame_timer.lap("display")
+            stddraw.pause(speed_game)
+        frame_timer.lap("wait")
 
         # merging the tiles
         grid.merge_tiles()
+        frame_timer.lap("merge")
         # checking and clearing the full lines
         grid.clear_rows()
+        frame_timer.lap("clear")
+        frame_timer.end_frame()
+        frame += 1
+
+
+# A function for running n_games headless games (without any window) with the
+# given policy (see simulation.simulate) on all the cores, writing the result of
+# each game to the given csv file as the results stream in (when a file is
+# given) and printing a summary of the games at the end
+def simulate(n_games=1000, policy=None, processes=None, seed=0, results_file=None):
+    n_played, total_score, best_score, victories = 0, 0, 0, 0
+    max_tiles = {}
+    out = open(results_file, "w") if results_file is not None else None
+    try:
+        if out is not None:
+            out.write(",".join(simulation.GameResult._fields) + "\n")
+        for result in simulation.simulate(n_games, policy, processes, seed=seed,
+                                          win_value=win_value):
+            n_played += 1
+            total_score += result.score
+            best_score = max(best_score, result.score)
+            victories += result.victory
+            max_tiles[result.max_tile] = max_tiles.get(result.max_tile, 0) + 1
+            if out is not None:
+                out.write(",".join(str(int(value)) for value in result) + "\n")
+    finally:
+        if out is not None:
+            out.close()
+    # print the summary of the games
+    print("games:", n_played)
+    print("mean score:", total_score / max(n_played, 1))
+    print("best score:", best_score)
+    print("victories:", victories)
+    for max_tile in sorted(max_tiles):
+        print("max tile", max_tile, ":", max_tiles[max_tile], "games")
+    return n_played, total_score, best_score, victories, max_tiles
+
+
+# A function for watching the replay in the given file from the given frame at
+# the given speed (1, 8 or "max", see replay.ReplayPlayer.play)
+def watch_replay(path, speed=1, start_frame=0):
+    player = replay.ReplayPlayer(path)
+    grid_h, grid_w = player.replay.grid_h, player.replay.grid_w
+    # set the drawing canvas as in the start function
+    stddraw.setCanvasSize(40 * grid_w + 110, 40 * grid_h)
+    stddraw.setXscale(-0.5, grid_w - 0.5 + 4)
+    stddraw.setYscale(-0.5, grid_h - 0.5)
+    # jump to the start frame without displaying the frames before it
+    player.seek(start_frame)
+    player.play(speed, speed_game)
+    # save the snapshots taken while playing for seeking faster next time
+    player.save_index()
+    return player
 
 
 # A method to restart the grid
@@ -164,7 +249,9 @@ def restart_the_grid(grid_h, grid_w, grid):
     # continue with the game setup as before
     Tetromino.grid_height = grid_h
     Tetromino.grid_width = grid_w
-    grid = GameGrid(grid_h, grid_w)
+    # start a new game with a new seed
+    new_game(grid_h, grid_w)
+    grid = GameGrid(grid_h, grid_w, win_value=win_value)
     current_tetromino = create_tetromino()
     grid.current_tetromino = current_tetromino
     next_tetromino = create_tetromino()
@@ -173,14 +260,37 @@ def restart_the_grid(grid_h, grid_w, grid):
     return current_tetromino, next_tetromino, grid
 
 
+# A function for starting a new game: seeds the random number generator of the
+# game with a new seed and starts recording the game (when replay_dir is set)
+def new_game(grid_h, grid_w):
+    global rng, game_seed, frame, recorder
+    game_seed = random.randrange(1 << 32)
+    rng = GameRandom(game_seed)
+    frame = 0
+    recorder = None
+    if replay_dir is not None:
+        recorder = replay.ReplayRecorder(game_seed, grid_h, grid_w, win_value)
+
+
+# A function for saving the replay of the current game (when it is recorded)
+# to a file named after its seed in replay_dir
+def save_replay():
+    global recorder
+    if recorder is not None:
+        os.makedirs(replay_dir, exist_ok=True)
+        recorder.save(os.path.join(replay_dir, "%d.replay" % game_seed), frame)
+        recorder = None
+
+
 # A function for creating random shaped tetrominoes to enter the game grid
+# (all the random values are drawn from the generator of the current game)
 def create_tetromino():
     # the type (shape) of the tetromino is determined randomly
     tetromino_types = ['I', 'O', 'Z', 'J', 'L', 'S', 'T']
-    random_index = random.randint(0, len(tetromino_types) - 1)
+    random_index = rng.randint(0, len(tetromino_types) - 1)
     random_type = tetromino_types[random_index]
     # create and return the tetromino
-    tetromino = Tetromino(random_type)
+    tetromino = Tetromino(random_type, rng)
     return tetromino
 
 
@@ -537,4 +647,25 @@ def display_game_menu(grid_height, grid_width):
 # start() function is specified as the entry point (main function) from which
 # the program starts execution
 if __name__ == '__main__':
-    start()
\ No newline at end of file
+    # "python Tetris_2048.py simulate [n_games]" runs headless games instead
+    if len(sys.argv) > 1 and sys.argv[1] == "simulate":
+        simulate(int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+                 simulation.random_policy)
+    # "python Tetris_2048.py replay file [speed] [frame]" plays a saved replay
+    elif len(sys.argv) > 2 and sys.argv[1] == "replay":
+        speed = sys.argv[3] if len(sys.argv) > 3 else "1"
+        watch_replay(sys.argv[2], speed if speed == "max" else float(speed),
+                     int(sys.argv[4]) if len(sys.argv) > 4 else 0)
+    # "python Tetris_2048.py profile [file]" dumps the timings of the phases of
+    # the frames (their 50th, 95th and 99th percentiles) to a file on exit
+    elif len(sys.argv) > 1 and sys.argv[1] == "profile":
+        frame_timer = frame_timing.PhaseTimer()
+        frame_timer.dump_on_exit(sys.argv[2] if len(sys.argv) > 2
+                                 else "frame_timing.json")
+        start()
+    # "python Tetris_2048.py record [directory]" saves the replays of the games
+    elif len(sys.argv) > 1 and sys.argv[1] == "record":
+        replay_dir = sys.argv[2] if len(sys.argv) > 2 else "replays"
+        start()
+    else:
+        start()
\ No newline at end of file
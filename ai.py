@@ -0,0 +1,513 @@
+################################################################################
+#                                                                              #
+# An automated player for Tetris 2048 that searches the placements of pieces   #
+#                                                                              #
+################################################################################
+from collections import deque, OrderedDict
+from functools import lru_cache  # used for memoizing the reachable placements
+import time  # used for the time budget of the search
+import numpy as np  # fundamental Python module for scientific computing
+import exponent_board as eb  # the compact board representation
+import zobrist  # used for hashing the boards in the transposition table
+from tetromino import ROTATIONS  # the rotation states of the tetromino types
+
+# the weights of the board features used for evaluating the placements
+WEIGHTS = {
+    'aggregate_height': -0.2,  # the sum of the column heights
+    'holes': -2.0,  # the empty cells below the tops of the columns
+    'bumpiness': -0.3,  # the sum of the height differences of the columns
+    'adjacent_equal': 0.2,  # the pairs of equal tiles next to each other
+    'merge_potential': 0.1,  # the column tops that a new 2 or 4 tile can merge
+    'lines': 2.0,  # the rows cleared by the placement
+    'score': 0.01,  # the score gained by the placement
+}
+# the value of a placement that ends the game
+GAME_OVER_VALUE = -1e9
+# the time of evaluating the placements of all the chance outcomes of an
+# unknown tetromino in one batch relative to the placements of one tetromino
+CHANCE_COST = 4
+
+
+# A function that returns all the placements of a tetromino of the given shape
+# in the given rotation state with the bottom left cell of its tile matrix at
+# (x, y) reachable by rotating it clockwise and then moving it left or right
+# while it falls down by one in each frame. The game grid is given by its
+# surface profile (the column heights as a tuple), where every cell below the
+# top of a column is taken as occupied. Each placement is returned as (keys,
+# rotation, x, y) where keys are the keys (one for each frame, None meaning no
+# key) that bring the tetromino to its final position. The placements are
+# memoized per (shape, rotation, position, surface profile).
+@lru_cache(maxsize=1 << 16)
+def reachable_placements(shape, rotation, x, y, heights, grid_h):
+    grid_w = len(heights)
+    states = ROTATIONS[shape]
+
+    # A function for checking if a tetromino in the given state fits at (x, y)
+    def fits(state, x, y):
+        if x + state.min_dx < 0 or x + state.max_dx >= grid_w:
+            return False
+        if y + state.min_dy < 0:
+            return False
+        # only the bottommost tile of each column can overlap a column
+        for dx, dy in state.bottoms:
+            if y + dy < heights[x + dx]:
+                return False
+        return True
+
+    # A function that returns the landing y of a tetromino in the given state
+    # at (x, y) (a tetromino that cannot move down, e.g. one that entered the
+    # game grid over the tiles, is locked where it is)
+    def landing_y(state, x, y):
+        if not fits(state, x, y - 1):
+            return y
+        return max([-state.min_dy] + [heights[x + dx] - dy
+                                      for dx, dy in state.bottoms])
+
+    placements = []
+    for n_rotations in range(4):
+        keys, r, cy = [], rotation, y
+        reachable = True
+        for i in range(n_rotations):
+            rotated = (r + 1) % 4
+            # wait (no key) until the rotated tetromino is inside the grid
+            while reachable and cy + states[rotated].max_dy >= grid_h:
+                reachable = fits(states[r], x, cy - 1)
+                keys.append(None)
+                cy -= 1
+            if not reachable or not fits(states[rotated], x, cy):
+                reachable = False
+                break
+            keys.append("space")
+            r = rotated
+            # the tetromino falls down by one after each key (auto fall)
+            if not fits(states[r], x, cy - 1):
+                reachable = False
+                break
+            cy -= 1
+        if not reachable:
+            continue
+        state = states[r]
+        # hard drop the tetromino without moving it
+        placements.append((tuple(keys) + ("h",), r, x, landing_y(state, x, cy)))
+        # move the tetromino left or right as far as it can go
+        for direction, dx in (("left", -1), ("right", 1)):
+            moves, px, py = list(keys), x, cy
+            while fits(state, px + dx, py):
+                moves.append(direction)
+                px += dx
+                if not fits(state, px, py - 1):
+                    # the tetromino locks at this position after this key
+                    placements.append((tuple(moves), r, px, py))
+                    break
+                py -= 1
+                placements.append((tuple(moves) + ("h",), r, px,
+                                   landing_y(state, px, py)))
+    return tuple(placements)
+
+
+# A function that returns the reachable placements of the current tetromino of
+# the given game grid (see reachable_placements) and the board they are made
+# on. The merges left on the board (e.g. after rows were cleared) are made at
+# the end of the next frame and the rows they fill are cleared, which may leave
+# other merges, so the tetromino is left to fall (no key) until the board has
+# no merges left and its keys are planned on that board.
+def plan_placements(grid, tetromino):
+    board = grid.board
+    grid_h = grid.grid_height
+    rotation = tetromino.rotation
+    state = ROTATIONS[tetromino.type][rotation]
+    x, y = tetromino.bottom_left_cell.x, tetromino.bottom_left_cell.y
+
+    # A function for checking if the tetromino fits at (x, y) on the board
+    def fits(y):
+        return y + state.min_dy >= 0 and not any(
+            y + dy < grid_h and board[y + dy, x + dx] for dx, dy in state.offsets)
+
+    waits = ()
+    while eb.mergeable_columns(board).size:
+        # the tetromino is locked where it is when it cannot fall
+        if not fits(y - 1):
+            return board, ((waits, rotation, x, y),)
+        board = board.copy()
+        eb.merge_tiles(board)
+        eb.clear_rows(board)
+        waits += (None,)
+        y -= 1
+    # a tetromino that entered the game grid over the tiles (which ends the
+    # game) cannot be placed on the surface profile, so it is only dropped
+    # down as far as it fits on the board
+    if not fits(y):
+        while fits(y - 1):
+            y -= 1
+        return board, ((waits + ("h",), rotation, x, y),)
+    placements = reachable_placements(tetromino.type, rotation, x, y,
+                                      tuple(eb.column_heights(board).tolist()),
+                                      grid_h)
+    if waits:
+        placements = tuple((waits + keys, rotation, x, y)
+                           for keys, rotation, x, y in placements)
+    return board, placements
+
+
+# A function that returns the board features used by the evaluation for a stack
+# of boards as a dictionary of arrays (one value per board)
+def board_features(boards):
+    occupied = boards != 0
+    heights = eb.column_heights(boards)
+    # the exponents of the topmost tiles of the columns (0 for empty columns)
+    tops = np.take_along_axis(boards, np.maximum(heights - 1, 0)[:, None, :],
+                              axis=1)[:, 0, :]
+    tops = np.where(heights > 0, tops, 0)
+    horizontal = (boards[:, :, 1:] == boards[:, :, :-1]) & occupied[:, :, 1:]
+    vertical = (boards[:, 1:, :] == boards[:, :-1, :]) & occupied[:, 1:, :]
+    return {
+        'aggregate_height': heights.sum(axis=1),
+        'holes': heights.sum(axis=1) - occupied.sum(axis=(1, 2)),
+        'bumpiness': np.abs(np.diff(heights, axis=1)).sum(axis=1),
+        'adjacent_equal': horizontal.sum(axis=(1, 2)) + vertical.sum(axis=(1, 2)),
+        'merge_potential': ((tops == 1) | (tops == 2)).sum(axis=1),
+    }
+
+
+# A function that places a tetromino of the given shape with the given tiles
+# (their exponents in the order of the cells of the rotation states) in each of
+# the given (rotation, x, y) placements on copies of the board, then merges and
+# clears them. Returns the resulting boards, the score gained and the cleared
+# rows of each placement, and a mask of the placements that end the game.
+def apply_placements(board, shape, tiles, placements):
+    states = ROTATIONS[shape]
+    positions = np.array(placements, dtype=np.int64).reshape(-1, 3)
+    offsets = np.array([states[rotation].offsets for rotation, _, _ in placements],
+                       dtype=np.int64).reshape(-1, 4, 2)
+    rows = positions[:, 2, None] + offsets[:, :, 1]
+    cols = positions[:, 1, None] + offsets[:, :, 0]
+    tiles = np.broadcast_to(np.asarray(tiles, dtype=np.uint8), rows.shape)
+    return place_tiles(board, rows, cols, tiles)
+
+
+# A function like apply_placements for tetrominoes of different shapes, where
+# each placement is given as a (shape, tiles, rotation, x, y) tuple
+def apply_pieces(board, pieces):
+    positions = np.array([piece[2:] for piece in pieces],
+                         dtype=np.int64).reshape(-1, 3)
+    offsets = np.array([ROTATIONS[shape][rotation].offsets
+                        for shape, _, rotation, _, _ in pieces],
+                       dtype=np.int64).reshape(-1, 4, 2)
+    rows = positions[:, 2, None] + offsets[:, :, 1]
+    cols = positions[:, 1, None] + offsets[:, :, 0]
+    tiles = np.array([piece[1] for piece in pieces], dtype=np.uint8).reshape(-1, 4)
+    return place_tiles(board, rows, cols, tiles)
+
+
+# A function that locks the given tiles (a k x 4 array of exponents) at the
+# given rows and columns (k x 4 arrays) on k copies of the board, then merges
+# and clears them (see apply_placements for the returned values)
+def place_tiles(board, rows, cols, tiles):
+    grid_h, grid_w = board.shape
+    k = len(rows)
+    boards = np.repeat(board[None], k, axis=0)
+    # lock the tiles (the game is over when any tile is above the game grid)
+    inside = rows < grid_h
+    owners = np.broadcast_to(np.arange(k)[:, None], rows.shape)
+    boards[owners[inside], rows[inside], cols[inside]] = tiles[inside]
+    game_over = ~inside.all(axis=1)
+    # merge the tiles in the columns of the locked tiles
+    keys = np.unique(owners[inside] * grid_w + cols[inside])
+    owners, cols = keys // grid_w, keys % grid_w
+    columns = boards[owners, :, cols]
+    merged, exponents = eb.merge_columns(columns)
+    boards[owners, :, cols] = columns
+    scores = np.bincount(owners[merged], weights=np.left_shift(1, exponents),
+                         minlength=k).astype(np.int64)
+    # clear the full rows
+    clear_scores, lines = eb.clear_rows_of_boards(boards)
+    return boards, scores + clear_scores, lines, game_over
+
+
+# A class for modeling an automated player that places each tetromino in the
+# best of all its reachable placements found by evaluating the resulting boards
+class PlacementAgent:
+    # A constructor that creates an agent with the given feature weights (the
+    # weights that are not given default to the values in WEIGHTS)
+    def __init__(self, weights=None):
+        self.weights = dict(WEIGHTS)
+        if weights is not None:
+            self.weights.update(weights)
+        # the tetromino being placed and the keys left for placing it
+        self.tetromino = None
+        self.keys = deque()
+
+    # A method that returns the values of the given boards from their features
+    # (an array with one value per board)
+    def board_values(self, boards):
+        values = np.zeros(len(boards))
+        for name, feature in board_features(boards).items():
+            values += self.weights[name] * feature
+        return values
+
+    # A method that places the given tetromino in each of the given placements
+    # and returns the resulting boards, the rewards of the placements (the
+    # weighted cleared rows and score) and a mask of the placements that end
+    # the game
+    def expand(self, board, shape, tiles, placements):
+        boards, scores, lines, game_over = apply_placements(board, shape, tiles,
+                                                            placements)
+        return boards, self.rewards(scores, lines), game_over
+
+    # A method that returns the rewards of placements with the given scores
+    # and cleared rows (the weighted sums of them)
+    def rewards(self, scores, lines):
+        return self.weights['lines'] * lines + self.weights['score'] * scores
+
+    # A method that returns the values of the given placements of the given
+    # tetromino on the game grid (an array with one value per placement)
+    def evaluate(self, board, shape, tiles, placements):
+        boards, rewards, game_over = self.expand(board, shape, tiles, placements)
+        values = rewards + self.board_values(boards)
+        values[game_over] = GAME_OVER_VALUE
+        return values
+
+    # A method that returns the keys of the best reachable placement of the
+    # given tetromino on the given game grid and the value of that placement
+    # (no keys and None when no placement is reachable)
+    def choose_placement(self, grid, tetromino):
+        board, placements = plan_placements(grid, tetromino)
+        if not placements:
+            return (), None
+        values = self.evaluate(board, tetromino.type,
+                               tetromino.get_tile_exponents(),
+                               [placement[1:] for placement in placements])
+        best = int(values.argmax())
+        return placements[best][0], values[best]
+
+    # A method that returns the key to press in this frame for placing the
+    # current tetromino of the given game grid (None for no key)
+    def next_key(self, grid):
+        tetromino = grid.current_tetromino
+        if tetromino is None:
+            return None
+        # plan the placement of each new tetromino once
+        if tetromino is not self.tetromino:
+            self.tetromino = tetromino
+            self.keys = deque(self.choose_placement(grid, tetromino)[0])
+        return self.keys.popleft() if self.keys else None
+
+    # the agent can be used as a policy of the headless engine
+    def __call__(self, engine):
+        return self.next_key(engine.grid)
+
+
+# A function that returns the outcomes of the chance node for an unknown
+# tetromino on a game grid with the given width as (shape, tiles, x,
+# probability) tuples. Each of the 7 types is equally likely and each tile is a
+# 2 or a 4 with the same probability (see Tile), so the outcomes are grouped by
+# the type with the expected tiles of a tetromino (two 2s and two 4s, where the
+# 4s are given to the first cells), and an unknown tetromino enters the game
+# grid in the middle.
+@lru_cache(maxsize=None)
+def chance_outcomes(grid_w):
+    outcomes = []
+    for shape in ROTATIONS:
+        x = (grid_w - ROTATIONS[shape][0].n) // 2
+        outcomes.append((shape, (2, 2, 1, 1), x, 1 / len(ROTATIONS)))
+    return tuple(outcomes)
+
+
+# An exception raised when the time budget of a search runs out
+class SearchTimeout(Exception):
+    pass
+
+
+# A class for modeling a transposition table that stores the values of the
+# searched positions with a bounded size, evicting the least recently used ones
+class TranspositionTable:
+    # A constructor for creating an empty table with the given maximum size
+    def __init__(self, max_size=1 << 16):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        # the numbers of the lookups found and not found in the table
+        self.hits = 0
+        self.misses = 0
+
+    # A method that returns the value stored for the given key (None if the
+    # key is not in the table)
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    # A method for storing the value of the given key
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# A class for modeling an automated player that searches the placements of the
+# current tetromino, the next tetromino (shown in the preview) and the unknown
+# tetrominoes after them with expectimax: the values of the placements are
+# maximized and the values of the unknown tetrominoes (their types) are
+# averaged. Only the beam_width best placements of each tetromino by their
+# static values (see evaluate) are searched deeper. The search is deepened one
+# ply at a time while the next ply is expected to finish within the time budget
+# (see ply_cost) and the result of the deepest complete ply is used.
+class ExpectimaxAgent(PlacementAgent):
+    # A constructor that creates an agent with the given feature weights, time
+    # budget per decision in seconds (less than a tick at the fastest game speed
+    # of 50 ms), maximum search depth in plies, number of placements searched
+    # deeper per tetromino and transposition table size
+    def __init__(self, weights=None, time_budget=0.04, max_depth=3,
+                 beam_width=3, table_size=1 << 16):
+        super().__init__(weights)
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.beam_width = beam_width
+        self.table = TranspositionTable(table_size)
+        # the depth of the deepest complete ply of the last search
+        self.depth = 0
+
+    # A method that returns the keys of the best reachable placement of the
+    # given tetromino on the given game grid and the value of that placement
+    # (no keys and None when no placement is reachable)
+    def choose_placement(self, grid, tetromino):
+        board, placements = plan_placements(grid, tetromino)
+        if not placements:
+            return (), None
+        tiles = tuple(tetromino.get_tile_exponents())
+        # the next tetromino is known (its tiles are created with it)
+        pieces = ()
+        if grid.next_tetromino is not None:
+            next_tetromino = grid.next_tetromino
+            next_tiles = tuple(next_tetromino.get_tile_exponents())
+            pieces = ((next_tetromino.type, next_tiles,
+                       next_tetromino.bottom_left_cell.x),)
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        best, value = 0, None
+        for depth in range(1, self.max_depth + 1):
+            # do not start a ply that cannot finish (its time would be wasted)
+            if depth > 1:
+                now = time.perf_counter()
+                if now + self.ply_cost(now - start, depth, len(pieces)) > deadline:
+                    break
+                start = now
+            try:
+                # the first ply is always completed
+                values = self.placement_values(
+                    board, tetromino.type, tiles,
+                    [placement[1:] for placement in placements], depth, pieces,
+                    deadline if depth > 1 else None)
+            except SearchTimeout:
+                break
+            best = int(values.argmax())
+            value = values[best]
+            self.depth = depth
+        return placements[best][0], value
+
+    # A method that estimates the time of searching to the given depth from the
+    # time of the ply before it: each of the beam_width placements searched at
+    # the last level of that ply becomes a node of the new ply, which evaluates
+    # the placements of one tetromino (about as long as the ply before it took
+    # per node) or of all the chance outcomes in one batch when the tetromino
+    # of the new ply is not one of the n_known known tetrominoes (about
+    # CHANCE_COST times as long)
+    def ply_cost(self, last_time, depth, n_known):
+        cost = last_time * self.beam_width
+        if depth - 1 > n_known:
+            cost *= CHANCE_COST
+        return cost
+
+    # A method that returns the values of the given placements of the given
+    # tetromino on the given board searched to the given depth, where pieces
+    # are the known tetrominoes after it as (shape, tiles, x) tuples. Only the
+    # beam_width best placements by their static values are searched deeper
+    # (the others have the value -inf when depth is more than 1).
+    def placement_values(self, board, shape, tiles, placements, depth, pieces,
+                         deadline):
+        if depth == 1:
+            return self.evaluate(board, shape, tiles, placements)
+        boards, rewards, game_over = self.expand(board, shape, tiles, placements)
+        static = rewards + self.board_values(boards)
+        static[game_over] = -np.inf
+        searched = np.argsort(-static, kind='stable')[:self.beam_width]
+        searched = searched[~game_over[searched]]
+        hashes = zobrist.hash_boards(boards[searched])
+        values = np.full(len(placements), -np.inf)
+        values[game_over] = GAME_OVER_VALUE
+        for i, board_hash in zip(searched, hashes.tolist()):
+            values[i] = rewards[i] + self.state_value(boards[i], board_hash,
+                                                      depth - 1, pieces, deadline)
+        return values
+
+    # A method that returns the value of the given board (with the given hash)
+    # searched to the given depth, where pieces are the known tetrominoes that
+    # enter the game grid next (the unknown ones are averaged over)
+    def state_value(self, board, board_hash, depth, pieces, deadline):
+        key = (board_hash, depth, pieces)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+        if pieces:
+            value = self.max_value(board, pieces[0], depth, pieces[1:], deadline)
+        elif depth == 1:
+            value = self.chance_value(board, deadline)
+        else:
+            value = 0.0
+            for shape, tiles, x, probability in chance_outcomes(board.shape[1]):
+                value += probability * self.max_value(board, (shape, tiles, x),
+                                                      depth, (), deadline)
+        self.table.put(key, value)
+        return value
+
+    # A method that returns the value of the best placement of the given
+    # tetromino (as a (shape, tiles, x) tuple) entering the game grid
+    def max_value(self, board, piece, depth, pieces, deadline):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SearchTimeout
+        shape, tiles, x = piece
+        grid_h = board.shape[0]
+        heights = tuple(eb.column_heights(board).tolist())
+        placements = reachable_placements(shape, 0, x, grid_h - 1, heights, grid_h)
+        if not placements:
+            return GAME_OVER_VALUE
+        values = self.placement_values(board, shape, tiles,
+                                       [placement[1:] for placement in placements],
+                                       depth, pieces, deadline)
+        return float(values.max())
+
+    # A method that returns the value of the given board averaged over the
+    # chance outcomes of the unknown tetromino entering the game grid with the
+    # best placement of each (the last ply of the search), where the placements
+    # of all the outcomes are evaluated in one batch
+    def chance_value(self, board, deadline):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SearchTimeout
+        grid_h = board.shape[0]
+        heights = tuple(eb.column_heights(board).tolist())
+        pieces, starts, probabilities = [], [], []
+        value = 0.0
+        for shape, tiles, x, probability in chance_outcomes(board.shape[1]):
+            placements = reachable_placements(shape, 0, x, grid_h - 1, heights,
+                                              grid_h)
+            if not placements:
+                value += probability * GAME_OVER_VALUE
+                continue
+            starts.append(len(pieces))
+            probabilities.append(probability)
+            pieces.extend((shape, tiles) + placement[1:]
+                          for placement in placements)
+        if pieces:
+            boards, scores, lines, game_over = apply_pieces(board, pieces)
+            values = self.rewards(scores, lines) + self.board_values(boards)
+            values[game_over] = GAME_OVER_VALUE
+            value += float(np.dot(probabilities,
+                                  np.maximum.reduceat(values, starts)))
+        return value
@@ -0,0 +1,331 @@
+################################################################################
+#                                                                              #
+# A batched headless engine that runs many games of Tetris 2048 in lockstep    #
+#                                                                              #
+################################################################################
+import numpy as np  # fundamental Python module for scientific computing
+import exponent_board as eb  # the compact board representation
+from tetromino import ROTATIONS  # the rotation states of the tetromino types
+from engine import ACTIONS  # the actions accepted by the headless engine
+
+# the tetromino types in the order of their indexes (as in create_tetromino)
+TYPES = ('I', 'O', 'Z', 'J', 'L', 'S', 'T')
+# the positions of the four cells of each tetromino type in each rotation state
+# relative to the bottom left cell of its tile matrix as (dx, dy), indexed as
+# OFFSETS[type, rotation, cell] (the i-th cell always holds the same tile)
+OFFSETS = np.array([[state.offsets for state in ROTATIONS[shape]]
+                    for shape in TYPES], dtype=np.int64)
+DX, DY = OFFSETS[..., 0].copy(), OFFSETS[..., 1].copy()
+# the extents of the cells of each tetromino type in each rotation state
+MIN_DX, MAX_DX, MIN_DY, MAX_DY = (
+    np.array([[getattr(state, extent) for state in ROTATIONS[shape]]
+              for shape in TYPES], dtype=np.int64)
+    for extent in ('min_dx', 'max_dx', 'min_dy', 'max_dy'))
+# the size n of the tile matrix of each tetromino type
+SIZES = np.array([ROTATIONS[shape][0].n for shape in TYPES], dtype=np.int64)
+
+# the action codes used by the step method (the indexes of engine.ACTIONS)
+NO_ACTION, LEFT, RIGHT, DOWN, ROTATE, HARD_DROP = range(len(ACTIONS))
+# the number of empty rows kept above each game grid, so that the cells of the
+# tetrominoes entering the grid can be looked up without bounds checks
+PADDING = max(SIZES)
+
+
+# A class for advancing many independent games at once with vectorized numpy
+# operations. The game grids are stored as a (n_games, grid_h, grid_w) array of
+# exponent boards (see exponent_board) and the rules are the same as those of
+# GameGrid: each step applies the action of each game, moves the tetrominoes
+# down by one, locks the landed tetrominoes, merges the tiles to a fixed point
+# and clears the full rows. Each game has its own random number stream, so the
+# games are independent of each other and of the batch size.
+class BatchEngine:
+    # A constructor for creating n_games games with the given grid size where
+    # seed is used for deriving the random number stream of each game
+    def __init__(self, n_games, grid_h=20, grid_w=12, win_value=2048,
+                 seed=None, buffer_size=256):
+        self.n_games = n_games
+        self.grid_height = grid_h
+        self.grid_width = grid_w
+        self.win_value = win_value
+        self.win_exponent = eb.exponent_of(win_value)
+        # the game grids of all the games in one contiguous buffer with PADDING
+        # empty rows above each game grid (boards is the view without them and
+        # cells is the flat buffer indexed by the flat positions of the cells)
+        padded = eb.new_boards(n_games, grid_h + PADDING, grid_w)
+        self.boards = padded[:, :grid_h]
+        self.cells = padded.reshape(-1)
+        self.cells_per_game = (grid_h + PADDING) * grid_w
+        # the flat positions of the cells of the tetrominoes relative to their
+        # bottom left cells indexed as DX and DY
+        self.flat_offsets = DY * grid_w + DX
+        # the current tetrominoes as their types, rotations, the positions of
+        # the bottom left cells of their tile matrices and the exponents of
+        # their four tiles
+        self.types = np.zeros(n_games, dtype=np.int64)
+        self.rotations = np.zeros(n_games, dtype=np.int64)
+        self.xs = np.zeros(n_games, dtype=np.int64)
+        self.ys = np.zeros(n_games, dtype=np.int64)
+        self.tiles = np.zeros((n_games, 4), dtype=np.uint8)
+        # the next tetrominoes (they enter the grid in their initial rotation)
+        self.next_types = np.zeros(n_games, dtype=np.int64)
+        self.next_xs = np.zeros(n_games, dtype=np.int64)
+        self.next_tiles = np.zeros((n_games, 4), dtype=np.uint8)
+        # the statistics of the games
+        self.score = np.zeros(n_games, dtype=np.int64)
+        self.max_exponent = np.zeros(n_games, dtype=np.int64)
+        # the exponents of the largest tiles reached so far (max_exponent is
+        # the largest tile on the board, which is lowered by clearing rows)
+        self.peak_exponent = np.zeros(n_games, dtype=np.int64)
+        self.frame = np.zeros(n_games, dtype=np.int64)
+        self.pieces = np.zeros(n_games, dtype=np.int64)
+        self.lines = np.zeros(n_games, dtype=np.int64)
+        self.merges = np.zeros(n_games, dtype=np.int64)
+        # the done masks of the games
+        self.game_over = np.zeros(n_games, dtype=bool)
+        self.victory = np.zeros(n_games, dtype=bool)
+        # the games whose boards changed by clearing rows in the last step and
+        # so may have tiles to merge in the next step (as in GameGrid, where
+        # merge_tiles and clear_rows run in every frame)
+        self.unsettled = np.zeros(n_games, dtype=bool)
+        # a random number stream (generator) for each game, read through a
+        # buffer of uniform random numbers so that the draws are vectorized
+        seeds = np.random.SeedSequence(seed).spawn(n_games)
+        self.generators = [np.random.default_rng(s) for s in seeds]
+        self.buffer_size = buffer_size
+        self.uniforms = np.empty((n_games, buffer_size))
+        self.next_uniform = np.full(n_games, buffer_size, dtype=np.int64)
+        self.reset()
+
+    # the games that are over or won
+    @property
+    def done(self):
+        return self.game_over | self.victory
+
+    # the largest tile value reached during each game
+    @property
+    def max_tile(self):
+        return np.where(self.peak_exponent > 0,
+                        np.left_shift(1, self.peak_exponent), 0)
+
+    # A method for (re)starting the given games (all the games by default)
+    # with empty game grids
+    def reset(self, games=None):
+        if games is None:
+            games = np.arange(self.n_games)
+        games = np.asarray(games, dtype=np.int64)
+        self.boards[games] = 0
+        for stat in (self.score, self.max_exponent, self.peak_exponent,
+                     self.frame, self.pieces, self.lines, self.merges):
+            stat[games] = 0
+        self.game_over[games] = False
+        self.victory[games] = False
+        self.unsettled[games] = False
+        # create the current and the next tetrominoes
+        self.create_tetrominoes(games)
+        self.spawn_next(games)
+
+    # A method that returns k uniform random numbers for each of the given games
+    # from their own random number streams as a (len(games), k) array
+    def draw_uniforms(self, games, k):
+        # refill the buffers of the games that do not have k numbers left
+        for game in games[self.next_uniform[games] + k > self.buffer_size]:
+            self.uniforms[game] = self.generators[game].random(self.buffer_size)
+            self.next_uniform[game] = 0
+        indexes = self.next_uniform[games][:, None] + np.arange(k)
+        self.next_uniform[games] += k
+        return self.uniforms[games[:, None], indexes]
+
+    # A method for creating random next tetrominoes for the given games with
+    # random types, random horizontal positions and random tiles (2 or 4)
+    def create_tetrominoes(self, games):
+        uniforms = self.draw_uniforms(games, 6)
+        types = (uniforms[:, 0] * len(TYPES)).astype(np.int64)
+        n_positions = self.grid_width - SIZES[types] + 1
+        self.next_types[games] = types
+        self.next_xs[games] = (uniforms[:, 1] * n_positions).astype(np.int64)
+        self.next_tiles[games] = np.where(uniforms[:, 2:] < 0.5, 1, 2)
+
+    # A method that makes the next tetrominoes of the given games enter their
+    # game grids and creates new next tetrominoes for them
+    def spawn_next(self, games):
+        self.types[games] = self.next_types[games]
+        self.rotations[games] = 0
+        self.xs[games] = self.next_xs[games]
+        self.ys[games] = self.grid_height - 1
+        self.tiles[games] = self.next_tiles[games]
+        self.create_tetrominoes(games)
+
+    # A method that returns the grid positions (rows, cols) of the cells of the
+    # tetrominoes of the given games in the given rotations and positions
+    def cell_positions(self, games, rotations, xs, ys):
+        types = self.types[games]
+        cols = xs[:, None] + DX[types, rotations]
+        rows = ys[:, None] + DY[types, rotations]
+        return rows, cols
+
+    # A method that returns a mask of the given games whose tetrominoes can be
+    # placed in the given rotations and positions, i.e. all of their tiles are
+    # inside the game grid or above it and none of them overlaps a locked tile
+    def can_place(self, games, rotations, xs, ys):
+        types = self.types[games]
+        inside = ((xs + MIN_DX[types, rotations] >= 0)
+                  & (xs + MAX_DX[types, rotations] < self.grid_width)
+                  & (ys + MIN_DY[types, rotations] >= 0))
+        # look up the four cells of each tetromino in the flat buffer (the
+        # cells above the grids are in the empty padding rows) and read them
+        # as one 32-bit number that is 0 when all four cells are empty
+        bottom_left = np.where(inside, games * self.cells_per_game
+                               + ys * self.grid_width + xs, 0)
+        cells = self.cells[bottom_left[:, None]
+                           + self.flat_offsets[types, rotations]]
+        return inside & (cells.view(np.uint32)[:, 0] == 0)
+
+    # A method that returns how many rows the tetrominoes of the given games
+    # can move down, found for all the games at once from the free cells below
+    # the tiles of the tetrominoes (i.e. the hard drop distances)
+    def drop_distances(self, games):
+        grid_h = self.grid_height
+        rows, cols = self.cell_positions(games, self.rotations[games],
+                                         self.xs[games], self.ys[games])
+        # the columns of the game grids below the tiles as (games, tiles, rows)
+        columns = self.boards[games[:, None], :, cols]
+        below = np.arange(grid_h) < rows[:, :, None]
+        occupied = (columns != 0) & below
+        # the row of the topmost occupied cell below each tile (-1 for none)
+        tops = np.where(occupied.any(axis=2),
+                        grid_h - 1 - occupied[:, :, ::-1].argmax(axis=2), -1)
+        return (rows - tops - 1).min(axis=1)
+
+    # A method for moving the tetrominoes of the given games by (dx, dy) when
+    # possible and returns a mask of the games whose tetrominoes moved
+    def move(self, games, dx, dy):
+        xs, ys = self.xs[games] + dx, self.ys[games] + dy
+        moved = self.can_place(games, self.rotations[games], xs, ys)
+        self.xs[games[moved]] = xs[moved]
+        self.ys[games[moved]] = ys[moved]
+        return moved
+
+    # A method for rotating the tetrominoes of the given games clockwise when
+    # the rotated tetrominoes are completely inside their game grids
+    def rotate(self, games):
+        rotations = (self.rotations[games] + 1) % 4
+        ys = self.ys[games]
+        rotated = self.can_place(games, rotations, self.xs[games], ys)
+        rotated &= ys + MAX_DY[self.types[games], rotations] < self.grid_height
+        self.rotations[games[rotated]] = rotations[rotated]
+
+    # A method for locking the tetrominoes of the given games onto their game
+    # grids (a game is over when any of its tiles is above its game grid) and
+    # returns the (game, column) pairs of the locked tiles as parallel arrays
+    def lock(self, games):
+        rows, cols = self.cell_positions(games, self.rotations[games],
+                                         self.xs[games], self.ys[games])
+        inside = rows < self.grid_height
+        owners = np.broadcast_to(games[:, None], rows.shape)[inside]
+        tiles = self.tiles[games]
+        self.cells[owners * self.cells_per_game + rows[inside] * self.grid_width
+                   + cols[inside]] = tiles[inside]
+        self.game_over[games] |= ~inside.all(axis=1)
+        locked_max = np.where(inside, tiles, 0).max(axis=1)
+        self.max_exponent[games] = np.maximum(self.max_exponent[games],
+                                              locked_max)
+        self.pieces[games] += 1
+        return owners, cols[inside]
+
+    # A method to merge the tiles in the given columns of the given games (as
+    # parallel arrays of unique (game, column) pairs) to a fixed point with the
+    # same rule as exponent_board.merge_tiles, working on all the columns at once
+    def merge_tiles(self, games, cols):
+        columns = self.boards[games, :, cols]
+        merged, exponents = eb.merge_columns(columns)
+        self.boards[games, :, cols] = columns
+        # update the statistics of the games
+        owners = games[merged]
+        np.add.at(self.score, owners, np.left_shift(1, exponents))
+        np.add.at(self.merges, owners, 1)
+        np.maximum.at(self.max_exponent, owners, exponents)
+
+    # A method to clear the full rows of the given games by compacting the
+    # remaining rows of each game in a single gather, and returns the games
+    # that had full rows
+    def clear_rows(self, games):
+        boards = self.boards[games]
+        scores, n_cleared = eb.clear_rows_of_boards(boards)
+        cleared = n_cleared > 0
+        games, boards = games[cleared], boards[cleared]
+        if games.size:
+            self.boards[games] = boards
+            self.score[games] += scores[cleared]
+            self.lines[games] += n_cleared[cleared]
+            self.max_exponent[games] = boards.max(axis=(1, 2))
+        return games
+
+    # A method that advances all the games that are not done by one frame after
+    # applying the given actions (an array of action codes, one for each game,
+    # or None for no action) and returns the done mask of the games
+    def step(self, actions=None):
+        active = ~self.done
+        # apply the actions as GameEngine.step does
+        if actions is not None:
+            actions = np.asarray(actions)
+            for code, dx, dy in ((LEFT, -1, 0), (RIGHT, 1, 0), (DOWN, 0, -1)):
+                games = np.flatnonzero(active & (actions == code))
+                if games.size:
+                    self.move(games, dx, dy)
+            games = np.flatnonzero(active & (actions == ROTATE))
+            if games.size:
+                self.rotate(games)
+            # hard drop the tetrominoes directly to their landing positions
+            games = np.flatnonzero(active & (actions == HARD_DROP))
+            if games.size:
+                self.ys[games] -= self.drop_distances(games)
+
+        # move the active tetrominoes down by one (auto fall)
+        games = np.flatnonzero(active)
+        locking = games[~self.move(games, 0, -1)]
+        # lock the tetrominoes that cannot go down anymore and let the next
+        # tetrominoes enter the game grids
+        grid_w = self.grid_width
+        keys = np.empty(0, dtype=np.int64)
+        if locking.size:
+            owners, cols = self.lock(locking)
+            self.spawn_next(locking)
+            # only the columns of the locked tiles may have new tiles to merge
+            keys = owners * grid_w + cols
+        # all the columns of the games with cleared rows in the last step may
+        # have tiles to merge
+        unsettled = np.flatnonzero(active & self.unsettled)
+        if unsettled.size:
+            self.unsettled[unsettled] = False
+            all_cols = (unsettled[:, None] * grid_w + np.arange(grid_w)).ravel()
+            keys = np.concatenate((keys, all_cols))
+        # merge the tiles and clear the full rows of the games whose boards
+        # changed (the other boards have nothing to merge or clear)
+        if keys.size:
+            # remove the repeated columns through a mask of all the columns
+            # (faster than sorting them)
+            changed = np.zeros(self.n_games * grid_w, dtype=bool)
+            changed[keys] = True
+            keys = np.flatnonzero(changed)
+            self.merge_tiles(keys // grid_w, keys % grid_w)
+            games = np.flatnonzero(changed.reshape(self.n_games, grid_w)
+                                   .any(axis=1))
+            # the largest tiles are taken before the rows are cleared
+            self.peak_exponent[games] = np.maximum(self.peak_exponent[games],
+                                                   self.max_exponent[games])
+            self.unsettled[self.clear_rows(games)] = True
+            self.victory[games] |= self.max_exponent[games] >= self.win_exponent
+        self.frame[active] += 1
+        return self.done
+
+    # A method that runs all the games until they are done, choosing the
+    # actions of each step by calling the given policy with this batch (no
+    # actions by default) or until max_frames steps, and returns the scores
+    def run(self, policy=None, max_frames=None):
+        n_steps = 0
+        while not self.done.all():
+            if max_frames is not None and n_steps >= max_frames:
+                break
+            self.step(policy(self) if policy is not None else None)
+            n_steps += 1
+        return self.score
@@ -0,0 +1,302 @@
+################################################################################
+#                                                                              #
+# Micro and macro benchmarks of Tetris 2048 with stored baselines              #
+#                                                                              #
+################################################################################
+#
+# python benchmark.py [--output results.json] [--compare baseline.json]
+#                     [--threshold 0.25] [--quick] [--cases name,...]
+#
+# The micro benchmarks time single operations of the game (seconds per call)
+# and the macro benchmarks time whole seeded games on a set of scenarios
+# (seconds per frame). The display is rendered offscreen. With --compare, the
+# results are compared with a stored baseline (e.g. benchmarks/baseline.json)
+# and the exit status is 1 when any case is slower than the baseline by more
+# than the threshold (0.25 = 25%).
+import os
+# render offscreen (must be set before pygame is imported)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import argparse  # used for parsing the command line arguments
+import json  # used for storing the results
+import platform  # used for describing the machine in the results
+import random  # used for the seeded scenarios and policies
+import sys
+import time  # used for timing the cases
+from collections import namedtuple
+import numpy as np  # fundamental Python module for scientific computing
+from engine import GameEngine, ACTIONS  # the headless engine
+from game_grid import GameGrid  # the class for modeling the game grid
+from tetromino import Tetromino  # the class for modeling the tetrominoes
+
+# the stored baseline used by default for comparing
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "benchmarks", "baseline.json")
+# the seed of all the boards, tetrominoes and policies of the benchmarks
+SEED = 2048
+# the size of the game grid of the micro benchmarks
+GRID_H, GRID_W = 20, 12
+
+# a benchmark case: setup returns a fresh state for each call of run (setup is
+# not timed), run is the timed code and frames is the number of frames that one
+# call of run simulates (0 for the micro benchmarks timed per call)
+Case = namedtuple('Case', ['name', 'setup', 'run', 'frames'])
+
+
+# A function that returns a board of the given size where the given number of
+# bottom rows are filled with random tiles (up to max_exponent) except for one
+# random empty cell in each row (so that no row is full)
+def random_board(grid_h, grid_w, n_rows, rng, max_exponent=6):
+    board = np.zeros((grid_h, grid_w), dtype=np.uint8)
+    for row in range(n_rows):
+        board[row] = [rng.randint(1, max_exponent) for col in range(grid_w)]
+        board[row, rng.randrange(grid_w)] = 0
+    return board
+
+
+# A function that returns a board where each column is a stack of tiles that
+# halve upwards (such as 256, 128, ..., 4, 2), so that a 2 landing on a column
+# merges all the way down (chain reactions)
+def cascade_board(grid_h, grid_w, rng):
+    board = np.zeros((grid_h, grid_w), dtype=np.uint8)
+    for col in range(grid_w):
+        height = rng.randint(4, 9)
+        board[:height, col] = np.arange(height, 0, -1)
+    return board
+
+
+# the scenarios of the macro benchmarks as functions that return the grid size
+# and the starting board (None for an empty board) for a random generator
+SCENARIOS = {
+    'empty': lambda rng: (GRID_H, GRID_W, None),
+    'nearly_full': lambda rng: (GRID_H, GRID_W,
+                                random_board(GRID_H, GRID_W, GRID_H - 4, rng)),
+    'cascade_heavy': lambda rng: (GRID_H, GRID_W,
+                                  cascade_board(GRID_H, GRID_W, rng)),
+    'tall_200_rows': lambda rng: (200, GRID_W, None),
+}
+
+
+# A function that creates a game engine for the given scenario and seed
+def create_engine(scenario, seed):
+    rng = random.Random(seed)
+    grid_h, grid_w, board = SCENARIOS[scenario](rng)
+    engine = GameEngine(grid_h, grid_w, seed=seed)
+    if board is not None:
+        grid = GameGrid(grid_h, grid_w, board, engine.win_value)
+        grid.current_tetromino = engine.grid.current_tetromino
+        grid.next_tetromino = engine.grid.next_tetromino
+        engine.grid = grid
+    return engine
+
+
+# A function that returns the macro benchmark case of a scenario: the given
+# number of frames of seeded games with random keys (a new game of the
+# scenario is started whenever a game ends)
+def game_case(scenario, frames):
+    def setup():
+        return [create_engine(scenario, SEED), random.Random(SEED), 0]
+
+    def run(state):
+        engine, rng, games = state
+        for frame in range(frames):
+            if engine.done:
+                games += 1
+                engine = create_engine(scenario, SEED + games)
+            engine.step(rng.choice(ACTIONS))
+
+    return Case("game." + scenario, setup, run, frames)
+
+
+# A function that returns a game grid with a random board for the micro
+# benchmarks (with the given number of filled rows) and a tetromino above it
+def create_grid(n_rows=8, shape='T'):
+    rng = random.Random(SEED)
+    Tetromino.grid_height, Tetromino.grid_width = GRID_H, GRID_W
+    grid = GameGrid(GRID_H, GRID_W, random_board(GRID_H, GRID_W, n_rows, rng))
+    tetromino = Tetromino(shape, rng)
+    tetromino.bottom_left_cell.x = GRID_W // 2 - 1
+    tetromino.bottom_left_cell.y = GRID_H - 6
+    grid.current_tetromino = tetromino
+    grid.next_tetromino = Tetromino('L', rng)
+    return grid
+
+
+# A function that returns a game grid with a board that has merges (cascades)
+def create_merge_grid():
+    board = cascade_board(GRID_H, GRID_W, random.Random(SEED))
+    # put a 2 on top of each column so that all the columns merge down
+    board[(board != 0).sum(axis=0), np.arange(GRID_W)] = 1
+    return GameGrid(GRID_H, GRID_W, board)
+
+
+# A function that returns a game grid with no tiles to merge (the rows of tiles
+# alternate between 2s and 4s)
+def create_settled_grid():
+    board = np.zeros((GRID_H, GRID_W), dtype=np.uint8)
+    board[:8] = (1 + np.arange(8) % 2)[:, None]
+    board[:8, 0] = 0
+    return GameGrid(GRID_H, GRID_W, board)
+
+
+# A function that returns a game grid with two full rows to clear
+def create_clear_grid():
+    grid = create_grid(8)
+    grid.board[2] = 3
+    grid.board[5] = 2
+    return GameGrid(GRID_H, GRID_W, grid.board)
+
+
+# A function that returns a game grid with a landed tetromino for the lock cases
+def create_lock_grid():
+    grid = create_grid(8)
+    tetromino = grid.current_tetromino
+    tetromino.bottom_left_cell = tetromino.get_landing_position(grid)
+    return grid, tetromino
+
+
+# A function that draws the canvas once so that the display can be timed
+def setup_canvas():
+    import lib.stddraw as stddraw
+    if not getattr(setup_canvas, 'done', False):
+        stddraw.setCanvasSize(40 * GRID_W + 110, 40 * GRID_H)
+        stddraw.setXscale(-0.5, GRID_W - 0.5 + 4)
+        stddraw.setYscale(-0.5, GRID_H - 0.5)
+        setup_canvas.done = True
+
+
+# A function that returns a game grid for the display case (a mid-game board
+# with a falling tetromino and a score)
+def create_display_grid():
+    setup_canvas()
+    grid = create_grid(8)
+    grid.score = 123456
+    return grid
+
+
+# A function that returns all the micro benchmark cases
+def micro_cases():
+    return [
+        Case("grid.merge_tiles", create_merge_grid,
+             lambda grid: grid.merge_tiles(), 0),
+        Case("grid.merge_tiles.no_merges", create_settled_grid,
+             lambda grid: grid.merge_tiles(), 0),
+        Case("grid.clear_rows", create_clear_grid,
+             lambda grid: grid.clear_rows(), 0),
+        Case("grid.clear_rows.no_full_rows", lambda: create_grid(8),
+             lambda grid: grid.clear_rows(), 0),
+        Case("grid.lock_tetromino", create_lock_grid,
+             lambda state: state[0].lock_tetromino(state[1]), 0),
+        Case("grid.has_value", lambda: create_grid(8),
+             lambda grid: grid.has_value(64), 0),
+        Case("tetromino.can_be_moved", lambda: create_grid(8),
+             lambda grid: grid.current_tetromino.can_be_moved("left", grid), 0),
+        Case("tetromino.rotate_clockwise", lambda: create_grid(8),
+             lambda grid: grid.current_tetromino.rotate_clockwise(grid), 0),
+        Case("tetromino.get_min_bounded_tile_matrix", lambda: create_grid(8),
+             lambda grid: grid.current_tetromino.get_min_bounded_tile_matrix(True),
+             0),
+        Case("grid.display", create_display_grid,
+             lambda grid: grid.display(0), 0),
+    ]
+
+
+# A function that returns all the macro benchmark cases (games of frames frames)
+def macro_cases(frames=2000):
+    return [game_case(scenario, frames) for scenario in SCENARIOS]
+
+
+# A function that times a case and returns the best time of repeat rounds in
+# seconds per call (or per frame for the macro cases), where each round calls
+# the case until min_time seconds are spent in it
+def time_case(case, repeat=5, min_time=0.2):
+    # warm up (e.g. the caches and the window of the display)
+    case.run(case.setup())
+    best = float('inf')
+    for i in range(repeat):
+        total, calls = 0.0, 0
+        while total < min_time:
+            state = case.setup()
+            start = time.perf_counter()
+            case.run(state)
+            total += time.perf_counter() - start
+            calls += 1
+        best = min(best, total / calls)
+    return best / case.frames if case.frames else best
+
+
+# A function that runs the given cases and returns the results as a dictionary
+# that can be stored as JSON
+def run_cases(cases, repeat=5, min_time=0.2, verbose=True):
+    results = {}
+    for case in cases:
+        seconds = time_case(case, repeat, min_time)
+        results[case.name] = {'seconds': seconds,
+                              'unit': 'frame' if case.frames else 'call'}
+        if verbose:
+            print("%-42s %12.2f us/%s" % (case.name, seconds * 1e6,
+                                          results[case.name]['unit']))
+    return {
+        'machine': {'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'platform': platform.platform(),
+                    'processor': platform.processor()},
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'results': results,
+    }
+
+
+# A function that compares the results with a baseline and returns the names
+# of the cases that are slower than the baseline by more than the threshold
+def compare(results, baseline, threshold=0.25, verbose=True):
+    regressions = []
+    for name, result in sorted(results['results'].items()):
+        if name not in baseline['results']:
+            continue
+        ratio = result['seconds'] / baseline['results'][name]['seconds']
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        if verbose:
+            print("%-42s %7.2fx %s" % (name, ratio,
+                                       "REGRESSION" if regressed else ""))
+    return regressions
+
+
+# A function that runs the benchmarks from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tetris 2048 benchmarks")
+    parser.add_argument("--output", help="the JSON file to store the results")
+    parser.add_argument("--compare", nargs="?", const=BASELINE,
+                        help="the baseline to compare with (%(const)s by default)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="the allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--quick", action="store_true",
+                        help="fewer and shorter rounds")
+    parser.add_argument("--cases", help="comma separated prefixes of the cases")
+    args = parser.parse_args(argv)
+
+    cases = micro_cases() + macro_cases(500 if args.quick else 2000)
+    if args.cases:
+        prefixes = args.cases.split(",")
+        cases = [case for case in cases
+                 if any(case.name.startswith(prefix) for prefix in prefixes)]
+    if args.quick:
+        results = run_cases(cases, repeat=3, min_time=0.05)
+    else:
+        results = run_cases(cases)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("%d case(s) regressed by more than %d%%" %
+                  (len(regressions), args.threshold * 100))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
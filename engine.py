@@ -0,0 +1,180 @@
+################################################################################
+#                                                                              #
+# A headless engine that runs the rules of Tetris 2048 without any drawing     #
+#                                                                              #
+################################################################################
+import random  # used for creating tetrominoes with random types (shapes)
+import numpy as np  # fundamental Python module for scientific computing
+import exponent_board as eb  # the exponents of the tile numbers
+from game_random import GameRandom  # the generator of the random numbers
+from game_grid import GameGrid  # the class for modeling the game grid
+from tetromino import Tetromino  # the class for modeling the tetrominoes
+
+# the actions accepted by the step method (the keys handled by the main game
+# loop in Tetris_2048.py, where None means that no key was pressed)
+ACTIONS = (None, "left", "right", "down", "space", "h")
+
+
+# the generator used when restoring the tetrominoes of a snapshot (their random
+# values are overwritten, so the generator of the game must not be used)
+_restore_rng = random.Random(0)
+
+
+# A function that returns the state of a tetromino as a (type, rotation, tile
+# exponents, x, y) tuple (None for no tetromino)
+def get_tetromino_state(tetromino):
+    if tetromino is None:
+        return None
+    position = tetromino.bottom_left_cell
+    return (tetromino.type, tetromino.rotation,
+            tuple(tetromino.get_tile_exponents()), position.x, position.y)
+
+
+# A function that creates a tetromino from its state (see get_tetromino_state)
+def create_tetromino_from_state(state):
+    if state is None:
+        return None
+    shape, rotation, exponents, x, y = state
+    tetromino = Tetromino(shape, _restore_rng)
+    tetromino.set_state(rotation, exponents, x, y)
+    return tetromino
+
+
+# A class for running the game rules without a window, drawing or sleeping.
+# Each call of step advances the game by one frame exactly as one iteration of
+# the main game loop in Tetris_2048.start() does, only without displaying it.
+class GameEngine:
+    # A constructor for creating a headless game with the given grid size (a
+    # game with a given seed is always the same for the same actions)
+    def __init__(self, grid_h=20, grid_w=12, win_value=2048, seed=None):
+        self.grid_height = grid_h
+        self.grid_width = grid_w
+        # the tile value that ends the game with a victory
+        self.win_value = win_value
+        self.reset(seed)
+
+    # A method for (re)starting the game with an empty game grid and the given
+    # seed (a new seed is drawn from the random module when it is not given)
+    def reset(self, seed=None):
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        # all the randomness of the game comes from this generator
+        self.rng = GameRandom(seed)
+        # set the game grid dimension values stored and used in the Tetromino class
+        Tetromino.grid_height = self.grid_height
+        Tetromino.grid_width = self.grid_width
+        self.grid = GameGrid(self.grid_height, self.grid_width,
+                             win_value=self.win_value)
+        self.grid.current_tetromino = self.create_tetromino()
+        self.grid.next_tetromino = self.create_tetromino()
+        # the number of frames (steps) simulated so far
+        self.frame = 0
+        # the numbers of placed tetrominoes, cleared lines and merges so far
+        self.pieces = 0
+        self.lines = 0
+        self.merges = 0
+        # the exponent of the largest tile reached so far (the tiles merged
+        # into it or cleared with a row do not lower it)
+        self.peak_exponent = 0
+        self.game_over = False
+        self.victory = False
+
+    # A method for creating random shaped tetrominoes to enter the game grid
+    # (the same as the create_tetromino function in Tetris_2048.py)
+    def create_tetromino(self):
+        tetromino_types = ['I', 'O', 'Z', 'J', 'L', 'S', 'T']
+        random_index = self.rng.randint(0, len(tetromino_types) - 1)
+        return Tetromino(tetromino_types[random_index], self.rng)
+
+    # the score of the game
+    @property
+    def score(self):
+        return self.grid.score
+
+    # the largest tile value reached during the game
+    @property
+    def max_tile(self):
+        return eb.number_of(self.peak_exponent)
+
+    # the game is done when it is over or won
+    @property
+    def done(self):
+        return self.game_over or self.victory
+
+    # A method that advances the game by one frame after applying the given
+    # action (one of ACTIONS) and returns True when the game has ended
+    def step(self, action=None):
+        if self.done:
+            return True
+        grid = self.grid
+        current_tetromino = grid.current_tetromino
+        # apply the action as the main game loop applies the typed key
+        if action == "left" or action == "right" or action == "down":
+            current_tetromino.move(action, grid, False)
+        elif action == "space":
+            current_tetromino.rotate_clockwise(grid)
+        elif action == "h":
+            current_tetromino.move("h", grid, True)
+
+        # move the active tetromino down by one (auto fall)
+        success = current_tetromino.move("down", grid, False)
+        # lock the active tetromino onto the grid when it cannot go down anymore
+        if not success:
+            self.game_over = grid.lock_tetromino(current_tetromino)
+            self.pieces += 1
+            # the next tetromino enters the game grid
+            grid.current_tetromino = grid.next_tetromino
+            grid.next_tetromino = self.create_tetromino()
+
+        # merge the tiles and clear the full lines (the largest tile is taken
+        # before the rows are cleared as clearing may remove it)
+        self.merges += len(grid.merge_tiles())
+        if grid.max_exponent > self.peak_exponent:
+            self.peak_exponent = grid.max_exponent
+        self.lines += grid.clear_rows()
+        self.frame += 1
+        # the game is won when a tile reaches the target value
+        if grid.has_won():
+            self.victory = True
+        return self.done
+
+    # A method that returns the state of the game as a tuple that can be given
+    # to restore: the counters, the board as bytes, the states of the current
+    # and the next tetromino and the state of the random number generator (an
+    # integer, see GameRandom)
+    def snapshot(self):
+        grid = self.grid
+        return (self.frame, self.pieces, self.lines, self.merges,
+                self.peak_exponent, grid.score, self.game_over, self.victory,
+                grid.board.tobytes(),
+                get_tetromino_state(grid.current_tetromino),
+                get_tetromino_state(grid.next_tetromino), self.rng.getstate())
+
+    # A method for restoring the state of the game from a snapshot (the game
+    # continues exactly as it did after the snapshot was taken)
+    def restore(self, snapshot):
+        (self.frame, self.pieces, self.lines, self.merges, self.peak_exponent,
+         score, self.game_over, self.victory, board, current_state, next_state,
+         rng_state) = snapshot
+        Tetromino.grid_height = self.grid_height
+        Tetromino.grid_width = self.grid_width
+        board = np.frombuffer(board, dtype=np.uint8).reshape(
+            self.grid_height, self.grid_width).copy()
+        self.grid = GameGrid(self.grid_height, self.grid_width, board,
+                             self.win_value)
+        self.grid.score = score
+        self.grid.game_over = self.game_over
+        self.grid.current_tetromino = create_tetromino_from_state(current_state)
+        self.grid.next_tetromino = create_tetromino_from_state(next_state)
+        self.rng.setstate(rng_state)
+
+    # A method that runs the game until it ends, choosing the action of each
+    # frame by calling the given policy with this engine (no key by default)
+    # or until max_frames frames are simulated, and returns the score
+    def run(self, policy=None, max_frames=None):
+        while not self.done:
+            if max_frames is not None and self.frame >= max_frames:
+                break
+            self.step(policy(self) if policy is not None else None)
+        return self.score
@@ -0,0 +1,189 @@
+################################################################################
+#                                                                              #
+# A compact board representation for the game grid of Tetris 2048              #
+#                                                                              #
+################################################################################
+import numpy as np  # fundamental Python module for scientific computing
+
+# A board is a (grid_h, grid_w) numpy array of uint8 values where each cell
+# holds log2 of the number on its tile (the exponent) and 0 means empty. Row 0
+# is the bottom row of the game grid as in GameGrid. As a board is a plain
+# array, many boards can be stored in one contiguous buffer (see new_boards).
+
+
+# A function that returns the exponent of a tile number (0 for no tile)
+def exponent_of(number):
+    return number.bit_length() - 1 if number else 0
+
+
+# A function that returns the tile number of an exponent (0 for no tile)
+def number_of(exponent):
+    return 1 << int(exponent) if exponent else 0
+
+
+# A function that returns the tile numbers of an array of exponents
+def numbers_of(exponents):
+    exponents = np.asarray(exponents, dtype=np.int64)
+    return np.where(exponents > 0, np.left_shift(1, exponents), 0)
+
+
+# the number of possible exponents (the values of a uint8 cell)
+N_EXPONENTS = 256
+
+
+# A function for creating an empty board
+def new_board(grid_h, grid_w):
+    return np.zeros((grid_h, grid_w), dtype=np.uint8)
+
+
+# A function for creating a contiguous buffer of n empty boards (each board is
+# the view boards[i] of this buffer)
+def new_boards(n, grid_h, grid_w):
+    return np.zeros((n, grid_h, grid_w), dtype=np.uint8)
+
+
+# A function for checking whether the cell with the given row and column
+# indexes is occupied by a tile (the cell must be inside the board)
+def is_occupied(board, row, col):
+    return board[row, col] != 0
+
+
+# A function for checking whether any tile on the board has the given number
+def has_value(board, value):
+    return bool((board == exponent_of(value)).any())
+
+
+# A function that returns the number of tiles with each exponent on the board
+# as a list indexed by the exponent (index 0 counts the empty cells)
+def tile_counts(board):
+    return np.bincount(board.ravel(), minlength=N_EXPONENTS).tolist()
+
+
+# A function that returns the occupied cells of each row of the board as a
+# list of integer bitmasks (bit col of the mask of a row is set when the cell
+# in that column is occupied)
+def row_masks(board):
+    packed = np.packbits(board != 0, axis=1, bitorder='little')
+    return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+
+# A function that returns the height of each column of the board (the index
+# of the topmost occupied row plus 1, or 0 for an empty column) as a numpy array
+# (for a stack of boards, the heights of the columns of each board)
+def column_heights(board):
+    occupied = board[..., ::-1, :] != 0
+    heights = board.shape[-2] - occupied.argmax(axis=-2)
+    return np.where(occupied.any(axis=-2), heights, 0)
+
+
+# A function that returns the indexes of the columns of the board that have any
+# equal tiles on top of each other (the columns changed by merge_tiles)
+def mergeable_columns(board):
+    lower, upper = board[:-1], board[1:]
+    return np.flatnonzero(((lower == upper) & (lower != 0)).any(axis=0))
+
+
+# A function to merge equal tiles vertically on the board (in place) until no
+# two equal tiles are on top of each other, so that chain reactions (such as
+# 2+2=4 landing on another 4) are resolved in a single call. The lowest equal
+# pair in a column is always merged first and the tiles above a merge drop by
+# one. Returns the list of the merge events as (row, col, number) tuples where
+# number is the number on the merged tile, which is also the score gained.
+# (The columns to merge can be given if they are known, see mergeable_columns.)
+def merge_tiles(board, cols=None):
+    events = []
+    grid_h = board.shape[0]
+    if cols is None:
+        cols = mergeable_columns(board)
+    for col in cols:
+        col = int(col)
+        # build the merged column bottom up as a stack where the tiles below
+        # the top of the stack have no equal pairs left
+        merged = []
+        for exponent in board[:, col].tolist():
+            merged.append(exponent)
+            while len(merged) > 1 and merged[-1] != 0 and merged[-1] == merged[-2]:
+                merged.pop()
+                merged[-1] += 1
+                events.append((len(merged) - 1, col, 1 << merged[-1]))
+        # write the whole column back with the emptied cells on the top
+        board[:, col] = merged + [0] * (grid_h - len(merged))
+    return events
+
+
+# A function to clear the full rows of the board (in place) by dropping the
+# rows above them and return the score gained, which is the sum of the numbers
+# of the tiles on the cleared rows, and the number of cleared rows
+def clear_rows(board):
+    # find all the full rows with one reduction
+    full_rows = board.all(axis=1)
+    n_cleared = int(full_rows.sum())
+    if n_cleared == 0:
+        return 0, 0
+    score = int(numbers_of(board[full_rows]).sum())
+    # compact the remaining rows to the bottom in a single gather (the order
+    # of the remaining rows is kept) and empty the rows above them
+    n_kept = board.shape[0] - n_cleared
+    board[:n_kept] = board[~full_rows]
+    board[n_kept:] = 0
+    return score, n_cleared
+
+
+# A function to merge the tiles of many columns given as the rows of a (k, h)
+# array (in place) to a fixed point with the same rule as merge_tiles, working
+# on all the columns at once. Returns the merges as two arrays: the indexes of
+# the merged columns and the exponents of the merged tiles (one per merge).
+def merge_columns(columns):
+    grid_h = columns.shape[1]
+    rows = np.arange(grid_h)
+    # the indexes of the columns still being merged and their contents
+    active, work = np.arange(len(columns)), columns.copy()
+    merged, exponents = [], []
+    while active.size:
+        pairs = (work[:, :-1] == work[:, 1:]) & (work[:, :-1] != 0)
+        # store the columns that have nothing left to merge and go on with the
+        # others only
+        merging = pairs.any(axis=1)
+        if not merging.all():
+            columns[active[~merging]] = work[~merging]
+            active, work, pairs = active[merging], work[merging], pairs[merging]
+            if not active.size:
+                break
+        # merge the lowest equal pair of each column
+        merge_rows = pairs.argmax(axis=1)
+        indexes = np.arange(active.size)
+        work[indexes, merge_rows] += 1
+        merged.append(active)
+        exponents.append(work[indexes, merge_rows].astype(np.int64))
+        # drop the tiles above each merge by one
+        sources = np.minimum(rows + (rows > merge_rows[:, None]), grid_h - 1)
+        work = np.take_along_axis(work, sources, axis=1)
+        work[:, -1] = 0
+    if not merged:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(merged), np.concatenate(exponents)
+
+
+# A function to clear the full rows of a stack of boards given as a (k, h, w)
+# array (in place) with the same rule as clear_rows, compacting the remaining
+# rows of each board in a single gather. Returns the scores gained and the
+# numbers of cleared rows as arrays (one value per board).
+def clear_rows_of_boards(boards):
+    grid_h = boards.shape[1]
+    full_rows = boards.all(axis=2)
+    n_cleared = full_rows.sum(axis=1)
+    scores = np.zeros(len(boards), dtype=np.int64)
+    cleared = np.flatnonzero(n_cleared)
+    if cleared.size:
+        full_rows, n_rows = full_rows[cleared], n_cleared[cleared]
+        cleared_boards = boards[cleared]
+        numbers = numbers_of(cleared_boards) * full_rows[:, :, None]
+        scores[cleared] = numbers.sum(axis=(1, 2))
+        # move the remaining rows to the bottom keeping their order (a stable
+        # sort puts the rows that are not full first) and empty the rows above
+        order = np.argsort(full_rows, axis=1, kind='stable')
+        cleared_boards = np.take_along_axis(cleared_boards, order[:, :, None],
+                                            axis=1)
+        cleared_boards[np.arange(grid_h) >= (grid_h - n_rows)[:, None]] = 0
+        boards[cleared] = cleared_boards
+    return scores, n_cleared
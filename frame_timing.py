@@ -0,0 +1,86 @@
+################################################################################
+#                                                                              #
+# Per-frame timing of the phases of the main game loop of Tetris 2048          #
+#                                                                              #
+################################################################################
+import atexit  # used for dumping the timings when the program exits
+import json  # used for writing the dumped timings
+import time  # used for measuring the wall time of the phases
+import numpy as np  # fundamental Python module for scientific computing
+
+# the phases of one frame of the main game loop in Tetris_2048.start()
+# ("wait" is the pause after the display that sets the speed of the game)
+PHASES = ("input", "fall", "lock", "display", "wait", "merge", "clear")
+
+
+# A class for recording the wall time spent in each phase of each frame into a
+# fixed-size ring buffer (the last capacity frames are kept)
+class PhaseTimer:
+    # A constructor for creating a timer for the given phases
+    def __init__(self, phases=PHASES, capacity=4096):
+        self.phases = tuple(phases)
+        self.indexes = {phase: i for i, phase in enumerate(self.phases)}
+        # the seconds spent in each phase (columns) of each frame (rows)
+        self.times = np.zeros((capacity, len(self.phases)))
+        # the row of the current frame and the number of the recorded frames
+        self.row = 0
+        self.n_frames = 0
+        self.last = None
+
+    # A method for starting the timing of a new frame
+    def begin_frame(self):
+        self.times[self.row] = 0
+        self.last = time.perf_counter()
+
+    # A method for adding the time since the last call (or since the start of
+    # the frame) to the given phase of the current frame
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.times[self.row, self.indexes[phase]] += now - self.last
+        self.last = now
+
+    # A method for ending the timing of the current frame
+    def end_frame(self):
+        self.row = (self.row + 1) % len(self.times)
+        self.n_frames += 1
+
+    # A method that returns the 50th, 95th and 99th percentiles of the time of
+    # each phase (and of the whole frames) over the recorded frames in
+    # milliseconds as a dictionary {phase: {"p50": ..., "p95": ..., "p99": ...}}
+    def percentiles(self):
+        times = self.times[:min(self.n_frames, len(self.times))] * 1000
+        if not len(times):
+            return {}
+        columns = dict(zip(self.phases, times.T))
+        columns["frame"] = times.sum(axis=1)
+        result = {}
+        for phase, column in columns.items():
+            p50, p95, p99 = np.percentile(column, [50, 95, 99])
+            result[phase] = {"p50": p50, "p95": p95, "p99": p99,
+                             "mean": column.mean(), "max": column.max()}
+        return result
+
+    # A method for writing the percentiles of the phases to the given JSON file
+    def dump(self, path):
+        with open(path, "w") as out:
+            json.dump({"frames": self.n_frames,
+                       "window": min(self.n_frames, len(self.times)),
+                       "unit": "ms", "phases": self.percentiles()},
+                      out, indent=2)
+
+    # A method for dumping the timings to the given file when the program exits
+    def dump_on_exit(self, path):
+        atexit.register(self.dump, path)
+
+
+# A class with the same methods as PhaseTimer that records nothing (used when
+# the timing is turned off so that the game loop needs no checks)
+class NullPhaseTimer:
+    def begin_frame(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
@@ -1,6 +1,9 @@
-import lib.stddraw as stddraw  # used for displaying the game grid
 from lib.color import Color  # used for coloring the game grid
 from point import Point  # used for tile positions
+from tile import Tile, get_stddraw  # used for drawing the game grid
+import exponent_board as eb  # the compact board storing the locked tiles
+import zobrist  # used for hashing the state of the game grid
+from tetromino import ROTATIONS  # the cells of the rotation states of tetrominoes
 import numpy as np  # fundamental Python module for scientific computing
 
 
@@ -8,12 +11,36 @@ import numpy as np  # fundamental Python module for scientific computing
 class GameGrid:
 
     # A constructor for creating the game grid based on the given arguments
-    def __init__(self, grid_h, grid_w):
+    # (a board can be given to store the grid in, e.g. a view of a buffer
+    # created by exponent_board.new_boards, and win_value is the tile value
+    # that wins the game)
+    def __init__(self, grid_h, grid_w, board=None, win_value=2048):
         # set the dimensions of the game grid as the given arguments
         self.grid_height = grid_h
         self.grid_width = grid_w
-        # create a tile matrix to store the tiles locked on the game grid
-        self.tile_matrix = np.full((grid_h, grid_w), None)
+        # create a board to store the exponents (log2 of the numbers) of the
+        # tiles locked on the game grid (0 for the empty cells)
+        if board is None:
+            board = eb.new_board(grid_h, grid_w)
+        self.board = board
+        # the occupied cells of each row as an integer bitmask (bit col is set
+        # when the cell in that column is occupied) for fast collision checks
+        self.row_masks = eb.row_masks(self.board)
+        # the height of each column (the index of its topmost occupied row plus
+        # 1) used for finding the landing positions of the tetrominoes
+        self.column_heights = eb.column_heights(self.board).tolist()
+        # the number of tiles with each exponent (a histogram of the tile values
+        # indexed by the exponent) and the largest exponent on the game grid
+        self.update_tile_counts()
+        # the tile value that wins the game
+        self.win_value = win_value
+        # the tiles used for drawing the locked tiles (one tile per exponent)
+        self.tiles = {}
+        # the 64-bit Zobrist hash of the state of the game grid (the locked
+        # tiles, the current tetromino and the next tetromino), which is updated
+        # with each change so that two states can be compared cheaply
+        self.hash = zobrist.hash_board(self.board)
+        self._current_tetromino = self._next_tetromino = None
         # create the tetromino that is currently being moved on the game grid
         self.current_tetromino = None
         # create the next tetromino to hold the next tetromino
@@ -31,32 +58,122 @@ class GameGrid:
         # score variable to hold the score
         self.score = 0
 
+    # the tetromino that is currently being moved on the game grid
+    @property
+    def current_tetromino(self):
+        return self._current_tetromino
+
+    @current_tetromino.setter
+    def current_tetromino(self, tetromino):
+        self.hash ^= (get_piece_key(zobrist.CURRENT, self._current_tetromino)
+                      ^ get_piece_key(zobrist.CURRENT, tetromino))
+        self._current_tetromino = tetromino
+
+    # the next tetromino shown on the right panel
+    @property
+    def next_tetromino(self):
+        return self._next_tetromino
+
+    @next_tetromino.setter
+    def next_tetromino(self, tetromino):
+        self.hash ^= (get_piece_key(zobrist.NEXT, self._next_tetromino)
+                      ^ get_piece_key(zobrist.NEXT, tetromino))
+        self._next_tetromino = tetromino
+
     # A method for displaying the game grid
     def display(self, speed=250):
-        # clear the background to empty_cell_color
-        stddraw.clear(self.empty_cell_color)
-        # draw the game grid
+        stddraw = get_stddraw()
+        # show only the changes since the frame shown on the window, which may
+        # also be the last frame of a previous game with the same grid size
+        # and style (the whole canvas is shown otherwise, e.g. after a menu)
+        shown = self.get_shown_state()
+        previous = stddraw.beginChanges(
+            ("game_grid", self.grid_height, self.grid_width,
+             self.empty_cell_color, self.line_color, self.boundary_color,
+             self.line_thickness, self.box_thickness), shown)
+        if previous is not None:
+            self.mark_changes(previous, shown)
+        # clear the background to empty_cell_color (by copying a cached layer
+        # of that color, which is faster than filling the canvas)
+        stddraw.drawLayer(("game_grid", self.empty_cell_color),
+                          self.draw_background)
+        # draw the game grid and its inner lines over the tiles (the lines are
+        # drawn once for each grid size and line style and then reused until
+        # the canvas changes)
         self.draw_grid()
+        stddraw.drawLayer(("game_grid_lines", self.grid_height, self.grid_width,
+                           self.line_color, self.line_thickness),
+                          self.draw_lines, transparent=True)
         # draw the current/active tetromino if it is not None
         # (the case when the game grid is updated)
         if self.current_tetromino is not None:
             self.current_tetromino.draw()
         # draw a box around the game grid
         self.draw_boundaries()
-        # draw the right panel
+        # draw the right panel (its static parts are drawn once and then
+        # reused as the lines of the game grid)
+        stddraw.drawLayer(("right_panel", self.grid_height),
+                          self.draw_right_panel_background, transparent=True)
         self.draw_right_panel()
         # show the resulting drawing with a pause duration = 250 ms
         stddraw.show(speed)
 
-    # A method for drawing the cells and the lines of the game grid
+    # A method that returns the state of the game grid as it is drawn: the
+    # exponents of the locked tiles, the (row, col, exponent) cells of the
+    # current tetromino inside the game grid (its tiles are drawn over the
+    # lines of the game grid unlike the locked tiles), the score and the next
+    # tetromino as (type, rotation, exponents)
+    def get_shown_state(self):
+        cells = ()
+        tetromino = self.current_tetromino
+        if tetromino is not None:
+            x, y = tetromino.bottom_left_cell.x, tetromino.bottom_left_cell.y
+            state = ROTATIONS[tetromino.type][tetromino.rotation]
+            cells = tuple((y + dy, x + dx, exponent) for (dx, dy), exponent
+                          in zip(state.offsets, tetromino.get_tile_exponents())
+                          if y + dy < self.grid_height)
+        next_tetromino = self.next_tetromino
+        if next_tetromino is not None:
+            next_tetromino = (next_tetromino.type, next_tetromino.rotation,
+                              tuple(next_tetromino.get_tile_exponents()))
+        return self.board.copy(), cells, self.score, next_tetromino
+
+    # A method for marking the parts of the canvas that changed between the two
+    # given shown states (see get_shown_state) so that only they are shown
+    def mark_changes(self, previous, current):
+        stddraw = get_stddraw()
+        # the changed cells of each row (merged, cleared or locked tiles) are
+        # marked as one rectangle from the first to the last changed cell
+        rows, cols = np.nonzero(previous[0] != current[0])
+        for row in np.unique(rows).tolist():
+            row_cols = cols[rows == row]
+            first, last = int(row_cols.min()), int(row_cols.max())
+            stddraw.markDirty(first - 0.5, row - 0.5, last - first + 1, 1)
+        # the cells of the current tetromino before and after it moved
+        if previous[1] != current[1]:
+            for row, col, exponent in previous[1] + current[1]:
+                stddraw.markDirty(col - 0.5, row - 0.5, 1, 1)
+        # the score and the next tetromino on the right panel
+        if previous[2] != current[2]:
+            stddraw.markDirty(11.5, 16.4, 4, 1.2)
+        if previous[3] != current[3]:
+            stddraw.markDirty(11.5, -0.5, 4, 4.5)
+
+    # A method for drawing the background of the game
+    def draw_background(self):
+        stddraw = get_stddraw()
+        # clear the background to empty_cell_color
+        stddraw.clear(self.empty_cell_color)
+
+    # A method for drawing the tiles locked on the game grid
     def draw_grid(self):
-        # for each cell of the game grid
-        for row in range(self.grid_height):
-            for col in range(self.grid_width):
-                # if the current grid cell is occupied by a tile
-                if self.tile_matrix[row][col] is not None:
-                    # draw this tile
-                    self.tile_matrix[row][col].draw(Point(col, row))
+        # draw a tile for each occupied cell of the game grid
+        for row, col in zip(*np.nonzero(self.board)):
+            self.get_tile(self.board[row, col]).draw(Point(col, row))
+
+    # A method for drawing the inner lines of the game grid
+    def draw_lines(self):
+        stddraw = get_stddraw()
         # draw the inner lines of the game grid
         stddraw.setPenColor(self.line_color)
         stddraw.setPenRadius(self.line_thickness)
@@ -69,8 +186,10 @@ class GameGrid:
             stddraw.line(start_x, y, end_x, y)
         stddraw.setPenRadius()  # reset the pen radius to its default value
 
-    # A method to draw right panel, that contains score, controls and next piece
-    def draw_right_panel(self):
+    # A method to draw the right panel without the score and the next piece:
+    # the panel, the headers and the controls
+    def draw_right_panel_background(self):
+        stddraw = get_stddraw()
         # set pen color and draw the rectangle
         stddraw.setPenColor(Color(167, 160, 151))
         stddraw.filledRectangle(11.5, -0.5, 4, self.grid_height)
@@ -81,8 +200,6 @@ class GameGrid:
         stddraw.setFontFamily("Arial Bold")
         stddraw.text(13.5, 4.5, "NEXT")
         stddraw.text(13.5, 18, "SCORE")
-        stddraw.setFontSize(40)
-        stddraw.text(13.5, 17, str(self.score))
 
         # writing the instructions onto the the right panel
         stddraw.setFontSize(22)
@@ -91,20 +208,34 @@ class GameGrid:
         stddraw.text(13.5, 9.5, "Hard Drop = H")
         stddraw.text(13.5, 10.25, "Pause Menu = P")
 
+    # A method to draw the score and the next piece on the right panel (see
+    # draw_right_panel_background for the rest of the panel)
+    def draw_right_panel(self):
+        stddraw = get_stddraw()
+        # writing the score
+        stddraw.setPenColor(Color(255, 255, 255))
+        stddraw.setFontSize(40)
+        stddraw.setFontFamily("Arial Bold")
+        stddraw.text(13.5, 17, str(self.score))
+
         # drawing the next tetromino at the bottom right
-        n = len(self.next_tetromino.tile_matrix)
+        next_tetromino = self.next_tetromino
+        state = ROTATIONS[next_tetromino.type][next_tetromino.rotation]
+        for (row, col), tile in zip(state.cells, next_tetromino.tiles):
+            # drawing each tile at the position of its cell
+            tile.draw(self.get_right_cell_position(row, col))
 
-        for row in range(n):
-            for col in range(n):
-                if self.next_tetromino.tile_matrix[row][col] is not None:
-                    # getting the position of the cell
-                    position = self.get_right_cell_position(row, col)
-                    # drawing it
-                    self.next_tetromino.tile_matrix[row][col].draw(position)
+    # A method that returns the tile used for drawing the locked tiles with the
+    # given exponent
+    def get_tile(self, exponent):
+        tile = self.tiles.get(exponent)
+        if tile is None:
+            tile = Tile(eb.number_of(exponent))
+            self.tiles[exponent] = tile
+        return tile
 
     # A method to get the position of the next tetromino to draw it
     def get_right_cell_position(self, row, col):
-        n = len(self.tile_matrix)  # n = number of rows = number of columns
         position = Point()
         # horizontal position of the cell
         position.x = 12.75 + col
@@ -114,6 +245,7 @@ class GameGrid:
 
     # A method for drawing the boundaries around the game grid
     def draw_boundaries(self):
+        stddraw = get_stddraw()
         # draw a bounding box around the game grid as a rectangle
         stddraw.setPenColor(self.boundary_color)  # using boundary_color
         # set the pen radius as box_thickness (half of this thickness is visible
@@ -131,8 +263,8 @@ class GameGrid:
         # have tiles with position.y >= grid_height
         if not self.is_inside(row, col):
             return False  # the cell is not occupied as it is outside the grid
-        # the cell is occupied by a tile if it is not None
-        return self.tile_matrix[row][col] is not None
+        # the cell is occupied by a tile if its exponent is not 0
+        return eb.is_occupied(self.board, row, col)
 
     # A method for checking whether the cell with the given row and col indexes
     # is inside the game grid or not
@@ -143,110 +275,171 @@ class GameGrid:
             return False
         return True
 
-    # A method that locks the tiles of a landed tetromino on the grid checking
-    # if the game is over due to having any tile above the topmost grid row.
-    # (This method returns True when the game is over and False otherwise.)
-    def update_grid(self, tiles_to_lock, blc_position):
+    # A method for checking whether a tetromino in the given rotation state (see
+    # tetromino.RotationState) can be placed with the bottom left cell of its
+    # tile matrix at (x, y), i.e. all of its tiles are inside the game grid or
+    # above it and none of them overlaps a locked tile
+    def can_place(self, state, x, y):
+        if x + state.min_dx < 0 or x + state.max_dx >= self.grid_width:
+            return False
+        if y + state.min_dy < 0:
+            return False
+        # test the rows of the tetromino shifted to x against the grid rows
+        row_masks = self.row_masks
+        for dy, mask in state.row_masks:
+            row = y + dy
+            if row < self.grid_height:
+                shifted = mask << x if x >= 0 else mask >> -x
+                if row_masks[row] & shifted:
+                    return False
+        return True
+
+    # A method that returns the lowest y value that the bottom left cell of a
+    # tetromino in the given rotation state at (x, y) can reach by moving down
+    def get_landing_y(self, state, x, y):
+        heights = self.column_heights
+        # the tetromino cannot go below the bottom of the game grid
+        landing_y = -state.min_dy
+        for dx, dy in state.bottoms:
+            height = heights[x + dx]
+            # the tetromino may be below the top of this column (e.g. under an
+            # overhang), so the height map cannot be used for finding the landing
+            if y + dy < height:
+                while self.can_place(state, x, y - 1):
+                    y -= 1
+                return y
+            # the bottommost tile of this column lands on top of the column
+            landing_y = max(landing_y, height - dy)
+        return landing_y
+
+    # A method that locks the tiles of a landed tetromino on the grid by writing
+    # its cells straight into the board from the offsets of its rotation state
+    # and checks if the game is over due to having any tile above the topmost
+    # grid row. (This method returns True when the game is over and False
+    # otherwise.)
+    def lock_tetromino(self, tetromino):
         # necessary for the display method to stop displaying the tetromino
         self.current_tetromino = None
-        # lock the tiles of the current tetromino (tiles_to_lock) on the grid
-        n_rows, n_cols = len(tiles_to_lock), len(tiles_to_lock[0])
-        for col in range(n_cols):
-            for row in range(n_rows):
-                # place each tile (occupied cell) onto the game grid
-                if tiles_to_lock[row][col] is not None:
-                    # compute the position of the tile on the game grid
-                    pos = Point()
-                    pos.x = blc_position.x + col
-                    pos.y = blc_position.y + (n_rows - 1) - row
-                    if self.is_inside(pos.y, pos.x):
-                        self.tile_matrix[pos.y][pos.x] = tiles_to_lock[row][col]
-                    # the game is over if any placed tile is above the game grid
-                    else:
-                        self.game_over = True
-        # return the value of the game_over flag
+        board, tile_counts = self.board, self.tile_counts
+        row_masks, column_heights = self.row_masks, self.column_heights
+        keys = zobrist.board_keys(self.grid_height, self.grid_width)
+        x, y = tetromino.bottom_left_cell.x, tetromino.bottom_left_cell.y
+        state = ROTATIONS[tetromino.type][tetromino.rotation]
+        for (dx, dy), tile in zip(state.offsets, tetromino.tiles):
+            grid_row, grid_col = y + dy, x + dx
+            # the game is over if any placed tile is above the game grid
+            if grid_row >= self.grid_height:
+                self.game_over = True
+                continue
+            exponent = eb.exponent_of(tile.number)
+            # (a tetromino entering the grid may cover a locked tile)
+            previous = board[grid_row, grid_col]
+            tile_counts[previous] -= 1
+            self.hash ^= int(keys[grid_row, grid_col, previous]
+                             ^ keys[grid_row, grid_col, exponent])
+            board[grid_row, grid_col] = exponent
+            tile_counts[exponent] += 1
+            if exponent > self.max_exponent:
+                self.max_exponent = exponent
+            row_masks[grid_row] |= 1 << grid_col
+            if grid_row >= column_heights[grid_col]:
+                column_heights[grid_col] = grid_row + 1
         return self.game_over
 
-    # A method to clear full rows
+    # A method to clear full rows and add the sum of their tiles to the score
+    # (returns the number of cleared rows)
     def clear_rows(self):
-        rows_to_clear = []
+        full_rows = self.board.all(axis=1)
+        if not full_rows.any():
+            return 0
+        # only the rows from the lowest full row up change
+        first_row = int(full_rows.argmax())
+        before = self.board[first_row:].copy()
+        score, n_cleared = eb.clear_rows(self.board)
+        self.score += score
+        self.update_hash(first_row, np.arange(self.grid_width), before,
+                         self.board[first_row:])
+        self.row_masks = eb.row_masks(self.board)
+        self.column_heights = eb.column_heights(self.board).tolist()
+        self.update_tile_counts()
+        return n_cleared
 
-        # Check for full rows and add them to rows_to_clear
-        for row in range(self.grid_height):
-            if all(self.tile_matrix[row]):
-                rows_to_clear.append(row)
+    # A method to merge tiles vertically on the game grid (including all the
+    # chain reactions) and update the score. Returns the list of the merge
+    # events as (row, col, number) tuples (see exponent_board.merge_tiles).
+    def merge_tiles(self):
+        cols = eb.mergeable_columns(self.board)
+        if not cols.size:
+            return []
+        before = self.board[:, cols]
+        events = eb.merge_tiles(self.board, cols)
+        self.update_hash(0, cols, before, self.board[:, cols])
+        for row, col, number in events:
+            self.score += number
+            # two tiles with the exponent below are replaced with the merged
+            # tile and one empty cell
+            exponent = eb.exponent_of(number)
+            self.tile_counts[exponent - 1] -= 2
+            self.tile_counts[exponent] += 1
+            self.tile_counts[0] += 1
+            if exponent > self.max_exponent:
+                self.max_exponent = exponent
+        self.row_masks = eb.row_masks(self.board)
+        # only the heights of the columns with merges change
+        heights = eb.column_heights(self.board[:, cols])
+        for col, height in zip(cols.tolist(), heights.tolist()):
+            self.column_heights[col] = height
+        return events
 
-        # Clear full rows and add their sum to the score
-        for row in rows_to_clear:
-            row_sum = sum(tile.number for tile in self.tile_matrix[row])
-            self.score += row_sum
-            self.tile_matrix[row] = [None] * self.grid_width  # Clear the row
+    # A method for updating the hash of the game grid when the cells in the
+    # given columns of the rows from first_row up change from the exponents
+    # before to after (only the changed cells are hashed)
+    def update_hash(self, first_row, cols, before, after):
+        rows, indexes = np.nonzero(before != after)
+        keys = zobrist.board_keys(self.grid_height, self.grid_width)
+        changes = (keys[rows + first_row, cols[indexes], before[rows, indexes]]
+                   ^ keys[rows + first_row, cols[indexes], after[rows, indexes]])
+        self.hash ^= int(np.bitwise_xor.reduce(changes))
 
-            for col in range(self.grid_width):
-                for r in range(row, self.grid_height - 1):
-                    # drop the tiles
-                    self.tile_matrix[r][col] = self.tile_matrix[r + 1][col]
+    # A method for recomputing the tile counts and the largest exponent from
+    # the board (used when many cells change at once, e.g. on clearing rows)
+    def update_tile_counts(self):
+        self.tile_counts = eb.tile_counts(self.board)
+        self.max_exponent = 0
+        for exponent in range(len(self.tile_counts) - 1, 0, -1):
+            if self.tile_counts[exponent] > 0:
+                self.max_exponent = exponent
+                break
 
-    # A method to merge tiles vertically on the game grid and update the score
-    def merge_tiles(self):
-        # looping through the whole array
-        for col in range(self.grid_width):
-            for row in range(self.grid_height - 1):
-                # if the current and tile above it not none
-                if self.tile_matrix[row][col] is not None and self.tile_matrix[row + 1][col] is not None:
-                    # if the current and tile above is equal
-                    if self.tile_matrix[row][col].number == self.tile_matrix[row + 1][col].number:
-                        # Merge the tiles
-                        self.tile_matrix[row][col].number *= 2
-                        # Make the above tile none
-                        self.tile_matrix[row + 1][col] = None
-                        # a loop to drop the tiles above the merging
-                        for r in range(row + 1, self.grid_height - 1):
-                            if self.tile_matrix[r][col] is None and self.tile_matrix[r + 1][col] is not None:
-                                self.tile_matrix[r][col] = self.tile_matrix[r + 1][col]
-                                self.tile_matrix[r + 1][col] = None
-
-                        merged_tile_num = self.tile_matrix[row][col].number
-                        # updating the background and foreground colors based on the number
-                        if merged_tile_num == 4:
-                            self.tile_matrix[row][col].set_background_color(Color(236, 224, 200))
-                        elif merged_tile_num == 8:
-                            self.tile_matrix[row][col].set_background_color(Color(243, 177, 121))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 16:
-                            self.tile_matrix[row][col].set_background_color(Color(245, 149, 99))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 32:
-                            self.tile_matrix[row][col].set_background_color(Color(249, 123, 98))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 64:
-                            self.tile_matrix[row][col].set_background_color(Color(246, 93, 59))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 128:
-                            self.tile_matrix[row][col].set_background_color(Color(238, 203, 102))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 256:
-                            self.tile_matrix[row][col].set_background_color(Color(237, 204, 99))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 512:
-                            self.tile_matrix[row][col].set_background_color(Color(239, 202, 88))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 1024:
-                            self.tile_matrix[row][col].set_background_color(Color(237, 198, 67))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-                        elif merged_tile_num == 2048:
-                            self.tile_matrix[row][col].set_background_color(Color(237, 198, 67))
-                            self.tile_matrix[row][col].set_foreground_color(Color(255, 255, 255))
-
-                        # Update score
-                        self.score += self.tile_matrix[row][col].number  # Example scoring mechanism
-
-
-    def has_value(self,value):
-        for col in range(self.grid_width):
-            for row in range(self.grid_height - 1):
-                if self.tile_matrix[row][col] is not None:
-                    num = self.tile_matrix[row][col].number 
-                    if num == value:
-                        return True
-        return False
\ No newline at end of file
+    # the largest tile value on the game grid (0 when it is empty)
+    @property
+    def max_tile(self):
+        return eb.number_of(self.max_exponent)
+
+    # A method that returns the number of tiles with each value on the game
+    # grid as a dictionary {value: count}
+    def get_tile_distribution(self):
+        return {eb.number_of(exponent): count
+                for exponent, count in enumerate(self.tile_counts)
+                if exponent > 0 and count > 0}
+
+    # A method for checking whether any tile on the game grid has the given value
+    def has_value(self, value):
+        exponent = eb.exponent_of(value)
+        # the value must be a power of 2 to be the number of a tile
+        if value <= 0 or eb.number_of(exponent) != value:
+            return False
+        return self.tile_counts[exponent] > 0
+
+    # A method for checking whether the game is won, i.e. a tile with the win
+    # value (or a larger one) is on the game grid
+    def has_won(self):
+        return self.max_tile >= self.win_value
+
+
+# A function that returns the key of the given tetromino in the given slot of
+# the hash of a game grid (0 for no tetromino, see zobrist.piece_key)
+def get_piece_key(slot, tetromino):
+    if tetromino is None:
+        return 0
+    return zobrist.piece_key(slot, tetromino.type, tetromino.get_tile_exponents())
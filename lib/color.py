@@ -9,9 +9,13 @@ objects.
 
 class Color:
     """
-    A Color object models an RGB color.
+    A Color object models an RGB color. Color objects are immutable
+    and have no per-instance dictionary, so one object can be shared
+    by everything drawn in that color.
     """
 
+    __slots__ = ('_r', '_g', '_b')
+
     #-------------------------------------------------------------------
 
     def __init__(self, r=0, g=0, b=0):
@@ -49,6 +53,24 @@ class Color:
 
     #-------------------------------------------------------------------
 
+    def __eq__(self, other):
+        """
+        Return True if self and other have the same components.
+        """
+        if not isinstance(other, Color):
+            return NotImplemented
+        return (self._r, self._g, self._b) == (other._r, other._g, other._b)
+
+    #-------------------------------------------------------------------
+
+    def __hash__(self):
+        """
+        Return the hash of the components of self.
+        """
+        return hash((self._r, self._g, self._b))
+
+    #-------------------------------------------------------------------
+
     def __str__(self):
         """
         Return the string equivalent of self, that is, a
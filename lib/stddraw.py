@@ -10,6 +10,8 @@ commonly used Color objects defined in the color module.
 import time
 import os
 import sys
+import collections
+import math
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
 import pygame
@@ -91,10 +93,41 @@ _ymax = None
 _fontFamily = _DEFAULT_FONT_FAMILY
 _fontSize = _DEFAULT_FONT_SIZE
 
+# The fonts loaded so far keyed on (family, size, bold), with the least
+# recently used font dropped when more than _FONT_CACHE_SIZE are loaded
+_FONT_CACHE_SIZE = 32
+_fontCache = collections.OrderedDict()
+
+# The sprites drawn by drawSprite keyed on (key, width, height, x, y), with
+# the sizes and the fractions of the position in pixels, cleared when the
+# canvas size or the scale changes and with the least recently used sprite
+# dropped when more than _SPRITE_CACHE_SIZE are drawn
+_SPRITE_CACHE_SIZE = 256
+_sprites = collections.OrderedDict()
+
+# The layers drawn by drawLayer keyed on their keys, cleared when the canvas
+# size or the scale changes and with the least recently used layer dropped
+# when more than _LAYER_CACHE_SIZE are drawn
+_LAYER_CACHE_SIZE = 8
+_layers = collections.OrderedDict()
+
+# The rectangles of the canvas (pygame Rects) marked by markDirty for the
+# next show, the key and the state of the drawing that marked them (None
+# when the next show copies the whole canvas) and the key and the state of
+# the drawing shown on the window canvas (None when it is not known, see
+# beginChanges)
+_dirtyRects = []
+_changesKey = None
+_changesState = None
+_shownKey = None
+_shownState = None
+
 _canvasWidth = float(_DEFAULT_CANVAS_SIZE)
 _canvasHeight = float(_DEFAULT_CANVAS_SIZE)
 _penRadius = None
 _penColor = _DEFAULT_PEN_COLOR
+# The pen color converted to a pygame.Color (see setPenColor)
+_penPygameColor = None
 _keysTyped = []
 
 # Has the window been created?
@@ -118,15 +151,21 @@ _mousePos = None
 
 #-----------------------------------------------------------------------
 
+# The pygame colors converted by _pygameColor keyed on (r, g, b), which
+# are shared as they are never changed
+_pygameColors = {}
+
 def _pygameColor(c):
     """
     Convert c, an object of type color.Color, to an equivalent object
     of type pygame.Color.  Return the result.
     """
-    r = c.getRed()
-    g = c.getGreen()
-    b = c.getBlue()
-    return pygame.Color(r, g, b)
+    rgb = (c.getRed(), c.getGreen(), c.getBlue())
+    color = _pygameColors.get(rgb)
+    if color is None:
+        color = pygame.Color(*rgb)
+        _pygameColors[rgb] = color
+    return color
 
 #-----------------------------------------------------------------------
 
@@ -184,6 +223,7 @@ def setCanvasSize(w=_DEFAULT_CANVAS_SIZE, h=_DEFAULT_CANVAS_SIZE):
     pygame.display.set_caption('stddraw window (r-click to save)')
     _surface = pygame.Surface((w, h))
     _surface.fill(_pygameColor(WHITE))
+    _canvasChanged()
     _windowCreated = True
 
 def setXscale(min=_DEFAULT_XMIN, max=_DEFAULT_XMAX):
@@ -200,6 +240,7 @@ def setXscale(min=_DEFAULT_XMIN, max=_DEFAULT_XMAX):
     size = max - min
     _xmin = min - _BORDER * size
     _xmax = max + _BORDER * size
+    _canvasChanged()
 
 def setYscale(min=_DEFAULT_YMIN, max=_DEFAULT_YMAX):
     """
@@ -215,6 +256,7 @@ def setYscale(min=_DEFAULT_YMIN, max=_DEFAULT_YMAX):
     size = max - min
     _ymin = min - _BORDER * size
     _ymax = max + _BORDER * size
+    _canvasChanged()
 
 def setPenRadius(r=_DEFAULT_PEN_RADIUS):
     """
@@ -229,13 +271,24 @@ def setPenRadius(r=_DEFAULT_PEN_RADIUS):
         raise Exception('Argument to setPenRadius() must be non-neg')
     _penRadius = r * float(_DEFAULT_CANVAS_SIZE)
 
+def getPenWidth(r=None):
+    """
+    Return the width in pixels of the lines drawn with pen radius r.
+    r defaults to the current pen radius.
+    """
+    if r is None:
+        return int(round(_penRadius))
+    return int(round(float(r) * _DEFAULT_CANVAS_SIZE))
+
 def setPenColor(c=_DEFAULT_PEN_COLOR):
     """
     Set the pen color to c, where c is an object of class color.Color.
     c defaults to stddraw.BLACK.
     """
     global _penColor
+    global _penPygameColor
     _penColor = c
+    _penPygameColor = _pygameColor(c)
 
 def setFontFamily(f=_DEFAULT_FONT_FAMILY):
     """
@@ -251,6 +304,17 @@ def setFontSize(s=_DEFAULT_FONT_SIZE):
     global _fontSize
     _fontSize = s
 
+def _canvasChanged():
+    """
+    Clear the sprites and the layers, which are drawn again when they
+    are drawn next, and forget the drawing shown on the window canvas
+    (called when the canvas size or the scale changes).
+    """
+    global _shownKey
+    _sprites.clear()
+    _layers.clear()
+    _shownKey = None
+
 #-----------------------------------------------------------------------
 
 def _makeSureWindowCreated():
@@ -274,7 +338,7 @@ def _pixel(x, y):
         _surface,
         int(round(xs)),
         int(round(xy)),
-        _pygameColor(_penColor))
+        _penPygameColor)
 
 def point(x, y):
     """
@@ -291,7 +355,7 @@ def point(x, y):
         ys = _scaleY(y)
         pygame.draw.ellipse(
             _surface,
-            _pygameColor(_penColor),
+            _penPygameColor,
             pygame.Rect(
                 xs-_penRadius,
                 ys-_penRadius,
@@ -319,7 +383,7 @@ def line(x0, y0, x1, y1):
     y1s = _scaleY(y1)
     pygame.draw.line(
        _surface,
-       _pygameColor(_penColor),
+       _penPygameColor,
        (x0s, y0s),
        (x1s, y1s),
        int(round(lineWidth)))
@@ -343,7 +407,7 @@ def circle(x, y, r):
         ys = _scaleY(y)
         pygame.draw.ellipse(
             _surface,
-            _pygameColor(_penColor),
+            _penPygameColor,
             pygame.Rect(xs-ws/2.0, ys-hs/2.0, ws, hs),
             int(round(_penRadius)))
 
@@ -366,7 +430,7 @@ def filledCircle(x, y, r):
         ys = _scaleY(y)
         pygame.draw.ellipse(
             _surface,
-            _pygameColor(_penColor),
+            _penPygameColor,
             pygame.Rect(xs-ws/2.0, ys-hs/2.0, ws, hs),
             0)
 
@@ -391,7 +455,7 @@ def rectangle(x, y, w, h):
         ys = _scaleY(y)
         pygame.draw.rect(
             _surface,
-            _pygameColor(_penColor),
+            _penPygameColor,
             pygame.Rect(xs, ys-hs, ws, hs),
             int(round(_penRadius)))
 
@@ -416,7 +480,7 @@ def filledRectangle(x, y, w, h):
         ys = _scaleY(y)
         pygame.draw.rect(
             _surface,
-            _pygameColor(_penColor),
+            _penPygameColor,
             pygame.Rect(xs, ys-hs, ws, hs),
             0)
 
@@ -456,7 +520,7 @@ def polygon(x, y):
     points.append((xScaled[0], yScaled[0]))
     pygame.draw.polygon(
         _surface,
-        _pygameColor(_penColor),
+        _penPygameColor,
         points,
         int(round(_penRadius)))
 
@@ -478,7 +542,31 @@ def filledPolygon(x, y):
     for i in range(len(x)):
         points.append((xScaled[i], yScaled[i]))
     points.append((xScaled[0], yScaled[0]))
-    pygame.draw.polygon(_surface, _pygameColor(_penColor), points, 0)
+    pygame.draw.polygon(_surface, _penPygameColor, points, 0)
+
+def getFont(family=None, size=None, bold=False):
+    """
+    Return the pygame font of font family family and font size size
+    (bold if bold is True). family and size default to the current
+    font family and font size. The font is loaded only the first time
+    and then taken from the font cache.
+    """
+    if family is None:
+        family = _fontFamily
+    if size is None:
+        size = _fontSize
+    key = (family, size, bold)
+    font = _fontCache.get(key)
+    if font is not None:
+        _fontCache.move_to_end(key)
+        return font
+    if not pygame.font.get_init():
+        pygame.font.init()
+    font = pygame.font.SysFont(family, size, bold)
+    _fontCache[key] = font
+    if len(_fontCache) > _FONT_CACHE_SIZE:
+        _fontCache.popitem(last=False)
+    return font
 
 def text(x, y, s):
     """
@@ -489,8 +577,8 @@ def text(x, y, s):
     y = float(y)
     xs = _scaleX(x)
     ys = _scaleY(y)
-    font = pygame.font.SysFont(_fontFamily, _fontSize)
-    text = font.render(s, 1, _pygameColor(_penColor))
+    font = getFont()
+    text = font.render(s, 1, _penPygameColor)
     textpos = text.get_rect(center=(xs, ys))
     _surface.blit(text, textpos)
 
@@ -503,11 +591,82 @@ def boldText(x, y, s):
     y = float(y)
     xs = _scaleX(x)
     ys = _scaleY(y)
-    font = pygame.font.SysFont(_fontFamily, _fontSize, True)
-    text = font.render(s, 1, _pygameColor(_penColor))
+    font = getFont(bold=True)
+    text = font.render(s, 1, _penPygameColor)
     textpos = text.get_rect(center=(xs, ys))
     _surface.blit(text, textpos)
 
+def drawSprite(x, y, w, h, key, render):
+    """
+    Draw on the background canvas a sprite of width w and height h
+    centered on (x, y). The sprite is the pygame Surface returned by
+    render(xs, ys, ws, hs), on which it is drawn at (xs, ys) with size
+    ws x hs in pixels, where xs and ys are the fractions of a pixel of
+    its position on the canvas (so it looks the same as when it is
+    drawn straight on the canvas). It is rendered the first time a
+    sprite with the given key, size and fractions is drawn and then
+    taken from the sprite cache until the canvas size or the scale
+    changes (or until it is the least recently used of more than
+    _SPRITE_CACHE_SIZE sprites).
+    """
+    _makeSureWindowCreated()
+    w = float(w)
+    h = float(h)
+    ws = _factorX(w)
+    hs = _factorY(h)
+    xs = _scaleX(float(x) - w / 2.0)
+    ys = _scaleY(float(y) - h / 2.0) - hs
+    left = int(math.floor(xs))
+    top = int(math.floor(ys))
+    spriteKey = (key, ws, hs, xs - left, ys - top)
+    sprite = _sprites.get(spriteKey)
+    if sprite is None:
+        sprite = render(xs - left, ys - top, ws, hs)
+        _sprites[spriteKey] = sprite
+        if len(_sprites) > _SPRITE_CACHE_SIZE:
+            _sprites.popitem(last=False)
+    else:
+        _sprites.move_to_end(spriteKey)
+    _surface.blit(sprite, (left, top))
+
+def drawLayer(key, render, transparent=False):
+    """
+    Draw on the background canvas the layer with the given key, which
+    covers the whole canvas (only the pixels drawn by render() when
+    transparent is True). The layer is drawn by render() with the
+    drawing functions of this module the first time a layer with the
+    given key is drawn and then taken from the layer cache until the
+    canvas size or the scale changes (or until it is the least recently
+    used of more than _LAYER_CACHE_SIZE layers).
+    """
+    global _surface
+    _makeSureWindowCreated()
+    layer = _layers.get(key)
+    if layer is None:
+        # draw the layer on a surface of its own instead of the canvas
+        surface = _surface
+        if transparent:
+            _surface = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+        else:
+            _surface = pygame.Surface(surface.get_size())
+        try:
+            render()
+            layer = (_surface, (0, 0))
+        finally:
+            _surface = surface
+        if transparent:
+            # keep only the part of the layer that has drawn pixels and
+            # run-length encode it for skipping its transparent pixels fast
+            rect = layer[0].get_bounding_rect()
+            layer = (layer[0].subsurface(rect).copy(), rect.topleft)
+            layer[0].set_alpha(255, pygame.RLEACCEL)
+        _layers[key] = layer
+        if len(_layers) > _LAYER_CACHE_SIZE:
+            _layers.popitem(last=False)
+    else:
+        _layers.move_to_end(key)
+    _surface.blit(*layer)
+
 def picture(pic, x=None, y=None):
     """
     Draw pic on the background canvas centered at (x, y).  pic is an
@@ -558,12 +717,73 @@ def save(f):
 
 #-----------------------------------------------------------------------
 
+def beginChanges(key, state):
+    """
+    Start a frame of the drawing with the given key (a value such as
+    a tuple of the settings of the drawing) that is shown by copying
+    only the rectangles that changed since its previous frame. state
+    is a copy of what the frame shows (e.g. the cells of a board),
+    which is kept until the next frame instead of the object that
+    draws it. Return the state of the frame shown on the window canvas
+    when it is a frame of a drawing with the same key, in which case
+    the next show copies only the rectangles marked with markDirty for
+    the differences between the two states. Otherwise, return None and
+    the next show copies the whole canvas.
+    """
+    global _changesKey
+    global _changesState
+    global _shownState
+    # the state of a drawing that is no longer shown (e.g. after the
+    # canvas was redrawn or changed) is not kept
+    if _shownKey is None:
+        _shownState = None
+    _changesKey = key
+    _changesState = state
+    del _dirtyRects[:]
+    if _shownKey is not None and _shownKey == key:
+        return _shownState
+    return None
+
+def markDirty(x, y, w, h):
+    """
+    Mark the rectangle of width w and height h whose lower left point
+    is (x, y) as changed since the previous frame (see beginChanges).
+    The rectangle is widened by a few pixels to cover the lines drawn
+    on its edges.
+    """
+    if _changesKey is None:
+        return
+    ws = _factorX(float(w))
+    hs = _factorY(float(h))
+    xs = _scaleX(float(x))
+    ys = _scaleY(float(y))
+    margin = int(round(_penRadius)) + 2
+    _dirtyRects.append(pygame.Rect(int(xs) - margin, int(ys - hs) - margin,
+                                   int(ws) + 2 * margin + 1,
+                                   int(hs) + 2 * margin + 1))
+
 def _show():
     """
-    Copy the background canvas to the window canvas.
-    """
-    _background.blit(_surface, (0, 0))
-    pygame.display.flip()
+    Copy the background canvas to the window canvas (only the
+    rectangles marked with markDirty when the window canvas shows the
+    previous frame of the same drawing, see beginChanges).
+    """
+    global _changesKey
+    global _changesState
+    global _shownKey
+    global _shownState
+    if _changesKey is not None and _shownKey == _changesKey:
+        for rect in _dirtyRects:
+            _background.blit(_surface, rect, rect)
+        pygame.display.update(_dirtyRects)
+    else:
+        _background.blit(_surface, (0, 0))
+        pygame.display.flip()
+    _shownKey = _changesKey
+    _shownState = _changesState
+    _changesKey = None
+    _changesState = None
+    del _dirtyRects[:]
     _checkForEvents()
 
 def _showAndWaitForever():
@@ -589,7 +809,12 @@ def show(msec=float('inf')):
     _makeSureWindowCreated()
     _show()
     _checkForEvents()
+    pause(msec)
 
+def pause(msec):
+    """
+    Wait for msec milliseconds without changing the window canvas.
+    """
     # Sleep for the required time, but check for events every
     # QUANTUM seconds.
     QUANTUM = .01
@@ -652,6 +877,7 @@ def _checkForEvents():
     """
     global _surface
     global _keysTyped
+    global _shownKey
     
     #-------------------------------------------------------------------
     # Begin added by Alan J. Broder
@@ -669,6 +895,10 @@ def _checkForEvents():
             sys.exit()
         elif event.type == pygame.KEYDOWN:
             _keysTyped = [pygame.key.name(event.key)] + _keysTyped
+        elif event.type == pygame.VIDEOEXPOSE:
+            # the window has to be redrawn, so the next show copies
+            # the whole canvas
+            _shownKey = None
         elif (event.type == pygame.MOUSEBUTTONUP) and \
             (event.button == 3):
             _saveToFile()
@@ -762,11 +992,12 @@ def mouseY():
 
 #-----------------------------------------------------------------------
 
-# Initialize the x scale, the y scale, and the pen radius.
+# Initialize the x scale, the y scale, the pen radius, and the pen color.
 
 setXscale()
 setYscale()
 setPenRadius()
+setPenColor()
 pygame.font.init()
 
 #-----------------------------------------------------------------------
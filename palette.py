@@ -0,0 +1,87 @@
+################################################################################
+#                                                                              #
+# The colors of the tiles of Tetris 2048 by the exponents of their numbers     #
+#                                                                              #
+################################################################################
+import colorsys  # used for generating the colors of the tiles beyond 2048
+from collections import namedtuple
+from lib.color import Color  # used for coloring the tiles
+import exponent_board as eb  # the exponents of the tile numbers
+
+# the colors of a tile: background, foreground (number) and box (boundary)
+PaletteEntry = namedtuple('PaletteEntry', ['background', 'foreground', 'box'])
+
+# the color of the boxes (boundaries) around the tiles
+BOX_COLOR = Color(141, 131, 121)
+# the foreground colors of the tiles
+DARK_TEXT, LIGHT_TEXT = Color(0, 0, 0), Color(255, 255, 255)
+
+# the (r, g, b) background colors of the tiles from 2 (exponent 1) to 2048
+# (exponent 11), the tiles from 8 on have light text
+BASE_BACKGROUNDS = [
+    (238, 228, 218),  # 2
+    (236, 224, 200),  # 4
+    (243, 177, 121),  # 8
+    (245, 149, 99),  # 16
+    (249, 123, 98),  # 32
+    (246, 93, 59),  # 64
+    (238, 203, 102),  # 128
+    (237, 204, 99),  # 256
+    (239, 202, 88),  # 512
+    (237, 198, 67),  # 1024
+    (237, 198, 67),  # 2048
+]
+LIGHT_TEXT_FROM = 3
+
+
+# A function that generates the (r, g, b) background color of a tile beyond
+# 2048 (exponent 12 and more): darker colors with hues spread by the golden
+# ratio so that the tiles next to each other in value look different
+def generate_background(exponent):
+    k = exponent - len(BASE_BACKGROUNDS)
+    hue = (0.12 + 0.618034 * k) % 1.0
+    lightness = max(0.25, 0.42 - 0.02 * k)
+    r, g, b = colorsys.hls_to_rgb(hue, lightness, 0.55)
+    return round(r * 255), round(g * 255), round(b * 255)
+
+
+# A function that builds the palette as a list indexed by the exponent (index 0
+# is None as it is not a tile) with one shared entry for each tile value
+def build_palette():
+    palette = [None]
+    for exponent in range(1, eb.N_EXPONENTS):
+        if exponent <= len(BASE_BACKGROUNDS):
+            background = Color(*BASE_BACKGROUNDS[exponent - 1])
+        else:
+            background = Color(*generate_background(exponent))
+        foreground = LIGHT_TEXT if exponent >= LIGHT_TEXT_FROM else DARK_TEXT
+        palette.append(PaletteEntry(background, foreground, BOX_COLOR))
+    return palette
+
+
+# the palette entries of all the exponents
+PALETTE = build_palette()
+# the entries converted to pygame colors (created when first drawn)
+_pygame_palette = [None] * len(PALETTE)
+
+
+# A function that returns the palette entry of the tiles with the given number
+def get_entry(number):
+    return PALETTE[eb.exponent_of(number)]
+
+
+# A function that returns the given palette entry converted to pygame colors
+def convert_entry(entry):
+    import pygame  # imported only when drawing (see tile.get_stddraw)
+    return PaletteEntry(*(pygame.Color(color.getRed(), color.getGreen(),
+                                       color.getBlue()) for color in entry))
+
+
+# A function that returns the palette entry of the tiles with the given
+# exponent converted to pygame colors (converted once and then shared)
+def get_pygame_entry(exponent):
+    entry = _pygame_palette[exponent]
+    if entry is None:
+        entry = convert_entry(PALETTE[exponent])
+        _pygame_palette[exponent] = entry
+    return entry
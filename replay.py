@@ -0,0 +1,334 @@
+################################################################################
+#                                                                              #
+# Recording and re-running games of Tetris 2048 from a compact binary format   #
+#                                                                              #
+################################################################################
+from collections import namedtuple
+import os  # used for checking if the index of a replay exists
+import struct  # used for packing the snapshots in the index of a replay
+import time  # used for skipping frames when playing at the maximum speed
+from engine import GameEngine, ACTIONS  # the headless engine
+from zobrist import PIECE_TYPES  # the types (shapes) of the tetrominoes
+
+# A replay file stores everything needed for re-running a game exactly:
+#   MAGIC, VERSION (one byte), then the varints seed, grid_h, grid_w, win_value
+#   and then one varint for each input: (frames since the previous input << 3)
+#   | key code, where the key code is the index of the key in ACTIONS
+# The stream ends with key code 0 (no key) whose frame is the number of frames
+# of the game. An input takes 1 byte when it comes within 15 frames of the
+# previous one and 2 bytes when it comes within 2047 frames.
+MAGIC = b"T2048"
+VERSION = 1
+# the number of bits of the key code in each input
+KEY_BITS = 3
+# the key code that ends the input stream
+END = 0
+
+# the suffix of the sidecar index file of a replay file, which stores the
+# snapshots of the game taken every K frames for seeking (the index is
+# rebuilt when it is missing or does not belong to the replay):
+#   MAGIC, INDEX_VERSION (one byte), then the varints seed, grid_h, grid_w,
+#   win_value, n_frames, the number of inputs and interval of the replay, the
+#   varint number of snapshots and the snapshots in the order of their frames
+# A snapshot (see GameEngine.snapshot) is stored as the varints frame, pieces,
+# lines, merges, peak_exponent, score and flags (game_over | victory << 1),
+# then grid_h * grid_w bytes of the board, the current and the next tetromino
+# (see PIECE) and the 8-byte state of the random number generator (see RNG).
+INDEX_SUFFIX = ".index"
+INDEX_VERSION = 3
+# a tetromino: its type (0 for no tetromino, else 1 + the index of the type in
+# PIECE_TYPES), rotation, the exponents of its 4 tiles and its position x, y
+PIECE = struct.Struct("<BB4Bhh")
+# the state of the random number generator of the game (see GameRandom)
+RNG = struct.Struct("<Q")
+
+# a parsed replay where inputs is the list of the (frame, key) inputs
+Replay = namedtuple('Replay', ['seed', 'grid_h', 'grid_w', 'win_value',
+                               'inputs', 'n_frames'])
+
+
+# A function for appending a non-negative integer to a bytearray as a varint
+# (7 bits per byte starting with the lowest bits, the high bit of each byte
+# is set when more bytes follow)
+def write_varint(data, value):
+    while value >= 0x80:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+# A function that reads a varint from the given bytes starting at pos and
+# returns its value and the position after it
+def read_varint(data, pos):
+    value, shift = 0, 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("truncated replay")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+# A class for recording the inputs of a game as they happen
+class ReplayRecorder:
+    # A constructor for starting the recording of a game with the given seed
+    # (see GameEngine) and settings
+    def __init__(self, seed, grid_h=20, grid_w=12, win_value=2048):
+        self.data = bytearray(MAGIC)
+        self.data.append(VERSION)
+        for value in (seed, grid_h, grid_w, win_value):
+            write_varint(self.data, value)
+        # the frame of the last input and the number of inputs recorded so far
+        self.last_frame = 0
+        self.n_inputs = 0
+        self.finished = False
+
+    # A method for recording the key pressed in the given frame (the keys that
+    # are not game inputs, such as None or "p" for pausing, are ignored)
+    def record(self, frame, key):
+        if key is None or key not in ACTIONS:
+            return
+        if self.finished or frame < self.last_frame:
+            raise ValueError("inputs must be recorded in the order of the frames")
+        write_varint(self.data, (frame - self.last_frame) << KEY_BITS
+                     | ACTIONS.index(key))
+        self.last_frame = frame
+        self.n_inputs += 1
+
+    # A method for ending the recording after the given number of frames and
+    # returning the recorded bytes
+    def finish(self, n_frames):
+        if not self.finished:
+            write_varint(self.data, (n_frames - self.last_frame) << KEY_BITS | END)
+            self.finished = True
+        return bytes(self.data)
+
+    # A method for ending the recording (see finish) and writing it to a file
+    def save(self, path, n_frames):
+        with open(path, "wb") as out:
+            out.write(self.finish(n_frames))
+
+
+# A function that parses the bytes of a replay and returns it as a Replay
+def parse_replay(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a replay")
+    pos = len(MAGIC)
+    if data[pos] != VERSION:
+        raise ValueError("unsupported replay version %d" % data[pos])
+    pos += 1
+    header = []
+    for i in range(4):
+        value, pos = read_varint(data, pos)
+        header.append(value)
+    inputs, frame = [], 0
+    while True:
+        value, pos = read_varint(data, pos)
+        frame += value >> KEY_BITS
+        code = value & ((1 << KEY_BITS) - 1)
+        if code == END:
+            return Replay(*header, inputs, frame)
+        if code >= len(ACTIONS):
+            raise ValueError("invalid key code %d" % code)
+        inputs.append((frame, ACTIONS[code]))
+
+
+# A function for appending a snapshot of a game (see GameEngine.snapshot) to a
+# bytearray in the layout of the index
+def write_snapshot(data, snapshot):
+    (frame, pieces, lines, merges, peak_exponent, score, game_over, victory,
+     board, current_state, next_state, rng_state) = snapshot
+    for value in (frame, pieces, lines, merges, peak_exponent, score,
+                  game_over | victory << 1):
+        write_varint(data, value)
+    data += board
+    for state in (current_state, next_state):
+        if state is None:
+            data += PIECE.pack(0, 0, 0, 0, 0, 0, 0, 0)
+        else:
+            shape, rotation, exponents, x, y = state
+            data += PIECE.pack(PIECE_TYPES.index(shape) + 1, rotation,
+                               *exponents, x, y)
+    data += RNG.pack(rng_state)
+
+
+# A function that reads a snapshot of a game with the given number of cells
+# from the given bytes starting at pos and returns it and the position after it
+def read_snapshot(data, pos, n_cells):
+    values = []
+    for i in range(7):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    flags = values.pop()
+    if pos + n_cells + 2 * PIECE.size + RNG.size > len(data):
+        raise ValueError("truncated index")
+    board = bytes(data[pos:pos + n_cells])
+    pos += n_cells
+    states = []
+    for i in range(2):
+        code, rotation, *exponents, x, y = PIECE.unpack_from(data, pos)
+        pos += PIECE.size
+        if code == 0:
+            states.append(None)
+        else:
+            states.append((PIECE_TYPES[code - 1], rotation, tuple(exponents),
+                           x, y))
+    rng_state, = RNG.unpack_from(data, pos)
+    pos += RNG.size
+    snapshot = (*values, bool(flags & 1), bool(flags & 2), board, *states,
+                rng_state)
+    return snapshot, pos
+
+
+# A function that reads a replay file and returns it as a Replay
+def load_replay(path):
+    with open(path, "rb") as replay_file:
+        return parse_replay(replay_file.read())
+
+
+# A function that re-runs a replay (a Replay, its bytes or a file path) with
+# the headless engine and returns the engine at the end of the game
+def run_replay(replay):
+    if isinstance(replay, str):
+        replay = load_replay(replay)
+    elif not isinstance(replay, Replay):
+        replay = parse_replay(replay)
+    engine = GameEngine(replay.grid_h, replay.grid_w, replay.win_value,
+                        replay.seed)
+    keys = dict(replay.inputs)
+    while engine.frame < replay.n_frames and not engine.done:
+        engine.step(keys.get(engine.frame))
+    return engine
+
+
+# A class for playing a replay, which can seek to any frame by restoring the
+# nearest snapshot of the game before it and simulating forward from there.
+# A snapshot is taken every interval frames as the frames are simulated and
+# the snapshots are saved to a sidecar index of the replay file.
+class ReplayPlayer:
+    # A constructor for creating a player for the given replay (a Replay, its
+    # bytes or a file path) at its first frame
+    def __init__(self, replay, interval=1000, index_path=None):
+        path = None
+        if isinstance(replay, str):
+            path, replay = replay, load_replay(replay)
+        elif not isinstance(replay, Replay):
+            replay = parse_replay(replay)
+        self.replay = replay
+        self.interval = interval
+        self.keys = dict(replay.inputs)
+        if index_path is None and path is not None:
+            index_path = path + INDEX_SUFFIX
+        self.index_path = index_path
+        self.engine = GameEngine(replay.grid_h, replay.grid_w, replay.win_value,
+                                 replay.seed)
+        # the snapshots of the game by their frames
+        self.snapshots = {0: self.engine.snapshot()}
+        if index_path is not None and os.path.exists(index_path):
+            self.load_index()
+
+    # the frame of the game shown by the player
+    @property
+    def frame(self):
+        return self.engine.frame
+
+    # the player is at the end when all the frames of the replay are played
+    @property
+    def at_end(self):
+        return self.engine.frame >= self.replay.n_frames or self.engine.done
+
+    # the key that identifies the replay of an index
+    def index_key(self):
+        replay = self.replay
+        return (INDEX_VERSION, replay.seed, replay.grid_h, replay.grid_w,
+                replay.win_value, replay.n_frames, len(replay.inputs),
+                self.interval)
+
+    # A method for loading the snapshots from the index of the replay (the
+    # index is ignored when it belongs to another replay or is not valid)
+    def load_index(self):
+        with open(self.index_path, "rb") as index_file:
+            data = index_file.read()
+        if data[:len(MAGIC) + 1] != MAGIC + bytes([INDEX_VERSION]):
+            return
+        n_cells = self.replay.grid_h * self.replay.grid_w
+        snapshots = {}
+        try:
+            pos = len(MAGIC) + 1
+            key = [INDEX_VERSION]
+            for i in range(len(self.index_key()) - 1):
+                value, pos = read_varint(data, pos)
+                key.append(value)
+            if tuple(key) != self.index_key():
+                return
+            n_snapshots, pos = read_varint(data, pos)
+            for i in range(n_snapshots):
+                snapshot, pos = read_snapshot(data, pos, n_cells)
+                snapshots[snapshot[0]] = snapshot
+        except ValueError:
+            return
+        self.snapshots.update(snapshots)
+
+    # A method for saving the snapshots to the index of the replay
+    def save_index(self):
+        data = bytearray(MAGIC)
+        data.append(INDEX_VERSION)
+        for value in self.index_key()[1:]:
+            write_varint(data, value)
+        write_varint(data, len(self.snapshots))
+        for frame in sorted(self.snapshots):
+            write_snapshot(data, self.snapshots[frame])
+        with open(self.index_path, "wb") as index_file:
+            index_file.write(data)
+
+    # A method for simulating the whole replay once to take all its snapshots
+    # and saving them to the index (when the replay has an index path)
+    def build_index(self):
+        frame = self.frame
+        self.seek(self.replay.n_frames)
+        if self.index_path is not None:
+            self.save_index()
+        self.seek(frame)
+
+    # A method that advances the game by one frame with the recorded key of
+    # that frame (returns False when the replay is at its end)
+    def step(self):
+        if self.at_end:
+            return False
+        engine = self.engine
+        engine.step(self.keys.get(engine.frame))
+        if engine.frame % self.interval == 0 and engine.frame not in self.snapshots:
+            self.snapshots[engine.frame] = engine.snapshot()
+        return True
+
+    # A method for moving the game to the given frame (headless), starting from
+    # the current frame or the nearest snapshot before the given frame
+    def seek(self, frame):
+        frame = max(0, min(frame, self.replay.n_frames))
+        start = max(f for f in self.snapshots if f <= frame)
+        if not start <= self.engine.frame <= frame:
+            self.engine.restore(self.snapshots[start])
+        while self.engine.frame < frame and self.step():
+            pass
+
+    # A method for playing the replay from the current frame to its end (or to
+    # the given frame) through GameGrid.display. At speed 1 each frame is shown
+    # for tick ms (the speed of the game) and at speed 8 for tick / 8 ms. At
+    # speed "max" the frames are simulated as fast as possible and at most
+    # max_fps frames are shown per second (the others are skipped).
+    def play(self, speed=1, tick=250, end_frame=None, max_fps=60):
+        if end_frame is None:
+            end_frame = self.replay.n_frames
+        next_display = 0
+        while self.frame < end_frame and self.step():
+            if speed == "max":
+                if (time.perf_counter() < next_display and self.frame < end_frame
+                        and not self.at_end):
+                    continue
+                self.engine.grid.display(0)
+                next_display = time.perf_counter() + 1 / max_fps
+            else:
+                self.engine.grid.display(tick / speed)
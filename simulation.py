@@ -0,0 +1,75 @@
+################################################################################
+#                                                                              #
+# Running many headless games of Tetris 2048 on all the cores (self-play)      #
+#                                                                              #
+################################################################################
+import multiprocessing  # used for running the games on a pool of processes
+import random  # used for seeding the games and for the random policy
+from collections import namedtuple
+import numpy as np  # fundamental Python module for scientific computing
+from engine import GameEngine, ACTIONS  # the headless engine
+
+# the result of a simulated game
+GameResult = namedtuple('GameResult', ['game', 'seed', 'score', 'max_tile',
+                                       'pieces', 'lines', 'merges', 'frames',
+                                       'victory'])
+
+# the settings of the games played by a worker process (set by init_worker)
+_worker_settings = None
+
+
+# A policy that presses a random key (or no key) in each frame
+def random_policy(engine):
+    return random.choice(ACTIONS)
+
+
+# A function that returns the seed of the game with the given index, derived
+# from the base seed so that each game has its own independent seed no matter
+# which worker plays it
+def game_seed(seed, game):
+    return int(np.random.SeedSequence([seed, game]).generate_state(1)[0])
+
+
+# A function that plays one game with the given seed and returns its result
+def play_game(game, seed, policy=None, grid_h=20, grid_w=12, win_value=2048,
+              max_frames=None):
+    # (the random module is seeded for the policies that use it)
+    random.seed(seed)
+    engine = GameEngine(grid_h, grid_w, win_value, seed)
+    engine.run(policy, max_frames)
+    return GameResult(game, seed, engine.score, engine.max_tile,
+                      engine.pieces, engine.lines, engine.merges, engine.frame,
+                      engine.victory)
+
+
+# A function for storing the settings of the games in a worker process (the
+# policy is sent once to each worker instead of with each chunk of games)
+def init_worker(settings):
+    global _worker_settings
+    _worker_settings = settings
+
+
+# A function that plays the games with the indexes in [start, stop) in a
+# worker process and returns their results as a list (a chunk)
+def play_chunk(bounds):
+    start, stop = bounds
+    seed, policy, grid_h, grid_w, win_value, max_frames = _worker_settings
+    return [play_game(game, game_seed(seed, game), policy, grid_h, grid_w,
+                      win_value, max_frames)
+            for game in range(start, stop)]
+
+
+# A generator function that plays n_games games with the given policy (a
+# picklable function or object called with the engine to choose the key of
+# each frame, no key by default) on a pool of processes (one for each core by
+# default) and yields the result of each game as the chunks of chunk_size
+# games are finished (so the results are not in the order of the games)
+def simulate(n_games, policy=None, processes=None, chunk_size=64, seed=0,
+             grid_h=20, grid_w=12, win_value=2048, max_frames=None):
+    settings = (seed, policy, grid_h, grid_w, win_value, max_frames)
+    chunks = ((start, min(start + chunk_size, n_games))
+              for start in range(0, n_games, chunk_size))
+    with multiprocessing.Pool(processes, initializer=init_worker,
+                              initargs=(settings,)) as pool:
+        for results in pool.imap_unordered(play_chunk, chunks):
+            yield from results
@@ -0,0 +1,90 @@
+import random
+import time
+import ai
+from engine import GameEngine
+
+
+# A function that plays the seeded game with a placement agent (and a few
+# random keys) and yields the engine each time a new tetromino enters the game
+# grid
+def new_tetrominoes(seed):
+    engine = GameEngine(seed=seed)
+    agent = ai.PlacementAgent()
+    rng = random.Random(seed)
+    pieces = -1
+    while not engine.done:
+        if engine.pieces != pieces:
+            pieces = engine.pieces
+            yield engine
+        if rng.random() < 0.9:
+            key = agent(engine)
+        else:
+            key = rng.choice(["space", "left", "right", None])
+        engine.step(key)
+
+
+# The keys of each planned placement must bring the tetromino to the
+# (rotation, x, y) of the placement when they are played with the engine (the
+# games are played until they are over, so the tetrominoes that enter the game
+# grid over the tiles are included)
+def test_reachable_placements_lead_to_their_positions():
+    for seed in range(12):
+        for n, engine in enumerate(new_tetrominoes(seed)):
+            if n % 3:
+                continue
+            grid = engine.grid
+            tetromino = grid.current_tetromino
+            board, placements = ai.plan_placements(grid, tetromino)
+            snapshot = engine.snapshot()
+            for keys, rotation, x, y in placements:
+                engine.restore(snapshot)
+                moving, pieces = engine.grid.current_tetromino, engine.pieces
+                for key in keys:
+                    engine.step(key)
+                while engine.pieces == pieces:
+                    engine.step(None)
+                landed = moving.bottom_left_cell
+                assert (moving.rotation, landed.x, landed.y) == (rotation, x, y)
+            engine.restore(snapshot)
+
+
+# The chance outcomes of the unknown tetrominoes evaluated in one batch must
+# give the same value as evaluating the best placement of each outcome
+def test_chance_value_averages_the_best_placements_of_the_outcomes():
+    agent = ai.ExpectimaxAgent()
+    for n, engine in enumerate(new_tetrominoes(3)):
+        if n > 100:
+            break
+        if n % 10:
+            continue
+        board = engine.grid.board
+        expected = sum(probability * agent.max_value(board, (shape, tiles, x), 1,
+                                                     (), None)
+                       for shape, tiles, x, probability
+                       in ai.chance_outcomes(board.shape[1]))
+        assert abs(agent.chance_value(board, None) - expected) < 1e-6
+
+
+# With the default settings the search must reach the unknown tetromino after
+# the next one (the chance outcomes) and decide within a tick of the fastest
+# game speed (50 ms)
+def test_expectimax_searches_a_chance_ply_within_the_deadline():
+    engine = GameEngine(seed=7)
+    agent = ai.ExpectimaxAgent()
+    decisions = 0
+    while not engine.done and engine.pieces < 30:
+        tetromino = engine.grid.current_tetromino
+        if tetromino is not None and tetromino is not agent.tetromino:
+            agent.table = ai.TranspositionTable()
+            start = time.perf_counter()
+            key = agent(engine)
+            elapsed = time.perf_counter() - start
+            assert elapsed < 0.05
+            assert agent.depth == 3
+            # the values of the boards averaged over the chance outcomes
+            assert any(not pieces for _, _, pieces in agent.table.entries)
+            decisions += 1
+        else:
+            key = agent(engine)
+        engine.step(key)
+    assert decisions == 30
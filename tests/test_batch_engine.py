@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import batch_engine as be
+from engine import GameEngine, ACTIONS, create_tetromino_from_state
+from game_grid import GameGrid
+
+
+# A function that returns the state of the current (or the next) tetromino of a
+# game of a batch in the form of engine.get_tetromino_state
+def batch_tetromino_state(batch, game, current=True):
+    if current:
+        return (be.TYPES[batch.types[game]], int(batch.rotations[game]),
+                tuple(int(e) for e in batch.tiles[game]), int(batch.xs[game]),
+                int(batch.ys[game]))
+    return (be.TYPES[batch.next_types[game]], 0,
+            tuple(int(e) for e in batch.next_tiles[game]),
+            int(batch.next_xs[game]), batch.grid_height - 1)
+
+
+# A function that sets the next tetromino of a mirrored game to the next
+# tetromino of the game of the batch (the two engines draw their tetrominoes
+# from different random number streams, everything else must be the same)
+def mirror_next(engine, batch, game):
+    engine.grid.next_tetromino = create_tetromino_from_state(
+        batch_tetromino_state(batch, game, current=False))
+
+
+# A function that fills the bottom rows of the odd games of a batch with random
+# tiles leaving one empty cell in each row (so that rows are cleared often),
+# which are merged in the first step as GameEngine merges them
+def fill_bottom_rows(batch, rng, n_rows=8):
+    for game in range(1, batch.n_games, 2):
+        board = batch.boards[game]
+        board[:n_rows] = rng.integers(1, 5, (n_rows, batch.grid_width))
+        board[np.arange(n_rows), rng.integers(0, batch.grid_width, n_rows)] = 0
+        batch.max_exponent[game] = board.max()
+        batch.unsettled[game] = True
+
+
+# Each game of a batch is mirrored by a GameEngine that gets the same actions
+# and the same tetrominoes, and the boards, the scores, the counters, the
+# current tetrominoes and the done flags are compared after every step
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_matches_game_engines(seed):
+    n_games, win_value = 16, 32
+    batch = be.BatchEngine(n_games, win_value=win_value, seed=seed)
+    rng = np.random.default_rng(seed)
+    fill_bottom_rows(batch, rng)
+    engines = []
+    for game in range(n_games):
+        engine = GameEngine(win_value=win_value, seed=seed)
+        engine.grid = GameGrid(batch.grid_height, batch.grid_width,
+                               batch.boards[game].copy(), win_value)
+        engine.grid.current_tetromino = create_tetromino_from_state(
+            batch_tetromino_state(batch, game))
+        mirror_next(engine, batch, game)
+        engines.append(engine)
+    # random actions with few hard drops so that the games last longer
+    weights = np.array([4, 2, 2, 1, 2, 0.5])
+    for step in range(3000):
+        if batch.done.all():
+            break
+        actions = rng.choice(len(ACTIONS), n_games, p=weights / weights.sum())
+        pieces = batch.pieces.copy()
+        batch.step(actions)
+        for game, engine in enumerate(engines):
+            if engine.done:
+                continue
+            engine.step(ACTIONS[actions[game]])
+            assert np.array_equal(engine.grid.board, batch.boards[game])
+            assert engine.score == batch.score[game]
+            assert engine.game_over == batch.game_over[game]
+            assert engine.victory == batch.victory[game]
+            assert (engine.pieces, engine.lines, engine.merges) == (
+                batch.pieces[game], batch.lines[game], batch.merges[game])
+            assert engine.max_tile == batch.max_tile[game]
+            if engine.done:
+                continue
+            current = engine.grid.current_tetromino
+            assert (current.type, current.rotation,
+                    tuple(current.get_tile_exponents()),
+                    current.bottom_left_cell.x, current.bottom_left_cell.y) \
+                == batch_tetromino_state(batch, game)
+            if batch.pieces[game] != pieces[game]:
+                mirror_next(engine, batch, game)
+    assert batch.done.all()
+    # the games must have cleared rows and some must have been won
+    assert batch.lines.sum() > 0 and batch.victory.any()
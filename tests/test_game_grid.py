@@ -0,0 +1,116 @@
+import random
+import numpy as np
+import exponent_board as eb
+import zobrist
+from engine import GameEngine, ACTIONS
+from game_grid import GameGrid
+
+
+# A function that returns the Zobrist hash of a game grid computed from scratch
+# (the board and the current and next tetrominoes)
+def full_hash(grid):
+    value = zobrist.hash_board(grid.board)
+    for slot, tetromino in ((zobrist.CURRENT, grid.current_tetromino),
+                            (zobrist.NEXT, grid.next_tetromino)):
+        if tetromino is not None:
+            value ^= zobrist.piece_key(slot, tetromino.type,
+                                       tetromino.get_tile_exponents())
+    return value
+
+
+# A function that plays the seeded games with random keys (half of them start
+# with nearly full bottom rows so that rows are cleared and merges cascade) and
+# yields the engine after each frame
+def play_games(n_games, max_frames=2000):
+    for seed in range(n_games):
+        rng = random.Random(seed)
+        engine = GameEngine(seed=seed)
+        if seed % 2:
+            board = eb.new_board(engine.grid_height, engine.grid_width)
+            for row in range(8):
+                board[row] = [rng.randint(1, 4) for col in range(engine.grid_width)]
+                board[row, rng.randrange(engine.grid_width)] = 0
+            grid = GameGrid(engine.grid_height, engine.grid_width, board)
+            grid.current_tetromino = engine.grid.current_tetromino
+            grid.next_tetromino = engine.grid.next_tetromino
+            engine.grid = grid
+        while not engine.done and engine.frame < max_frames:
+            engine.step(rng.choice(ACTIONS))
+            yield engine
+
+
+# The hash of the game grid that is updated with each change must be the hash
+# computed from scratch after every frame
+def test_incremental_hash_matches_full_hash():
+    lines = 0
+    for engine in play_games(200):
+        assert engine.grid.hash == full_hash(engine.grid)
+        lines += engine.lines
+    assert lines > 0
+
+
+# The row bitmasks, the column heights, the tile counts and the largest tile
+# that are kept up to date with the board must match the board after every frame
+def test_board_invariants():
+    for engine in play_games(200):
+        grid = engine.grid
+        assert grid.row_masks == eb.row_masks(grid.board)
+        assert grid.column_heights == eb.column_heights(grid.board).tolist()
+        assert grid.tile_counts == eb.tile_counts(grid.board)
+        assert grid.max_exponent == grid.board.max()
+
+
+# A function that returns a game grid with the given columns of tile numbers
+# (bottom up) starting from the given column
+def grid_with_columns(columns, first_col=3):
+    board = eb.new_board(20, 12)
+    for col, numbers in enumerate(columns, first_col):
+        board[:len(numbers), col] = [eb.exponent_of(n) for n in numbers]
+    return GameGrid(20, 12, board)
+
+
+# The merges of a column are resolved to the end (chain reactions included) in
+# one call, which returns the (row, col, number) events and adds their numbers
+# to the score
+def test_merge_tiles_resolves_chain_reactions():
+    cases = [
+        ([2, 2, 4], [8], [(0, 4), (0, 8)]),
+        ([4, 2, 2], [8], [(1, 4), (0, 8)]),
+        ([2, 2, 4, 8, 16], [32], [(0, 4), (0, 8), (0, 16), (0, 32)]),
+        ([4, 2, 2, 8], [16], [(1, 4), (0, 8), (0, 16)]),
+        ([4, 2, 2, 16], [8, 16], [(1, 4), (0, 8)]),
+        ([2, 4, 8], [2, 4, 8], []),
+        # the tiles above a gap are not merged across it and keep the gap
+        ([2, 2, 0, 4], [4, 0, 4], [(0, 4)]),
+        ([2, 2, 0, 8, 8], [4, 0, 16], [(0, 4), (2, 16)]),
+    ]
+    for column, expected, expected_events in cases:
+        grid = grid_with_columns([column])
+        events = grid.merge_tiles()
+        assert events == [(row, 3, number) for row, number in expected_events]
+        assert grid.score == sum(number for row, number in expected_events)
+        numbers = eb.numbers_of(grid.board[:, 3]).tolist()
+        assert numbers == expected + [0] * (20 - len(expected))
+        assert grid.hash == full_hash(grid)
+        assert grid.merge_tiles() == []
+
+    # the vectorized kernel of BatchEngine gives the same columns and merges
+    columns = [column + [0] * (20 - len(column)) for column, _, _ in cases]
+    board = np.array([[eb.exponent_of(n) for n in column] for column in columns],
+                     dtype=np.uint8)
+    merged, exponents = eb.merge_columns(board)
+    for index, (column, expected, expected_events) in enumerate(cases):
+        assert eb.numbers_of(board[index]).tolist()[:len(expected)] == expected
+        assert sorted(eb.number_of(int(e)) for e in exponents[merged == index]) \
+            == sorted(number for row, number in expected_events)
+
+
+# The merges of different columns do not affect each other
+def test_merge_tiles_merges_all_columns():
+    grid = grid_with_columns([[2, 2, 4], [2, 4, 8], [8, 8, 16]])
+    events = grid.merge_tiles()
+    assert sorted(events) == [(0, 3, 4), (0, 3, 8), (0, 5, 16), (0, 5, 32)]
+    assert grid.score == 4 + 8 + 16 + 32
+    assert eb.numbers_of(grid.board[:3, 3:6]).tolist() == [[8, 2, 32],
+                                                           [0, 4, 0],
+                                                           [0, 8, 0]]
@@ -0,0 +1,105 @@
+import random
+import replay
+from engine import GameEngine, ACTIONS
+
+
+# A function that plays a seeded game with random keys (mostly no key so that
+# the game lasts longer), records it and returns the engine and the recorder
+def record_game(seed):
+    rng = random.Random(seed)
+    engine = GameEngine(seed=seed)
+    recorder = replay.ReplayRecorder(engine.seed)
+    while not engine.done:
+        key = rng.choice(ACTIONS + (None,) * 6)
+        recorder.record(engine.frame, key)
+        engine.step(key)
+    return engine, recorder
+
+
+# A function that returns the state of a game compared by the tests
+def game_state(engine):
+    return (engine.frame, engine.score, engine.grid.hash,
+            engine.grid.board.tobytes())
+
+
+def test_varint_round_trip():
+    data = bytearray()
+    values = [0, 1, 127, 128, 300, 16383, 16384, 1 << 32, (1 << 64) - 1]
+    for value in values:
+        replay.write_varint(data, value)
+    pos = 0
+    for value in values:
+        read, pos = replay.read_varint(data, pos)
+        assert read == value
+    assert pos == len(data)
+
+
+# A recorded game must be re-run exactly from its replay
+def test_replay_round_trip(tmp_path):
+    for seed in range(20):
+        engine, recorder = record_game(seed)
+        path = str(tmp_path / ("%d.replay" % seed))
+        recorder.save(path, engine.frame)
+        loaded = replay.load_replay(path)
+        assert (loaded.seed, loaded.n_frames) == (seed, engine.frame)
+        assert len(loaded.inputs) == recorder.n_inputs
+        assert game_state(replay.run_replay(path)) == game_state(engine)
+
+
+# Seeking to any frame (forwards, backwards and from the snapshots stored in
+# the index of the replay) must give the same game as playing up to that frame
+def test_seek_matches_playing(tmp_path):
+    engine, recorder = record_game(2048)
+    path = str(tmp_path / "game.replay")
+    recorder.save(path, engine.frame)
+    n_frames = engine.frame
+    # the states of the game at all the frames by playing the replay
+    keys = dict(replay.load_replay(path).inputs)
+    engine = GameEngine(seed=2048)
+    states = {0: game_state(engine)}
+    while engine.frame < n_frames:
+        engine.step(keys.get(engine.frame))
+        states[engine.frame] = game_state(engine)
+
+    frames = list(range(0, n_frames + 1, 7)) + [n_frames, 1, 0]
+    random.Random(0).shuffle(frames)
+    player = replay.ReplayPlayer(path, interval=50)
+    player.build_index()
+    assert len(player.snapshots) == n_frames // 50 + 1
+    # a new player seeks from the snapshots loaded from the index
+    player = replay.ReplayPlayer(path, interval=50)
+    assert len(player.snapshots) == n_frames // 50 + 1
+    for frame in frames:
+        player.seek(frame)
+        assert game_state(player.engine) == states[frame]
+
+
+# The index of a replay must be ignored when it belongs to another replay
+def test_index_of_another_replay_is_ignored(tmp_path):
+    path = str(tmp_path / "game.replay")
+    engine, recorder = record_game(1)
+    recorder.save(path, engine.frame)
+    replay.ReplayPlayer(path, interval=50).build_index()
+    engine, recorder = record_game(2)
+    recorder.save(path, engine.frame)
+    player = replay.ReplayPlayer(path, interval=50)
+    assert list(player.snapshots) == [0]
+    player.seek(engine.frame)
+    assert game_state(player.engine) == game_state(engine)
+
+
+# An index that is not valid (e.g. truncated) must be ignored
+def test_invalid_index_is_ignored(tmp_path):
+    path = str(tmp_path / "game.replay")
+    engine, recorder = record_game(3)
+    recorder.save(path, engine.frame)
+    replay.ReplayPlayer(path, interval=50).build_index()
+    with open(path + replay.INDEX_SUFFIX, "rb") as index_file:
+        data = index_file.read()
+    for end in (3, len(data) // 2, len(data) - 1):
+        with open(path + replay.INDEX_SUFFIX, "wb") as index_file:
+            index_file.write(data[:end])
+        player = replay.ReplayPlayer(path, interval=50)
+        assert list(player.snapshots) == [0]
+        player.seek(engine.frame)
+        assert game_state(player.engine) == game_state(engine)
@@ -4,88 +4,102 @@ import copy as cp  # the copy module is used for copying tiles and positions
 import random  # the random module is used for generating random values
 import numpy as np  # the fundamental Python module for scientific computing
 from lib.color import Color
-
-
-# A class for modeling tetrominoes with 3 out of 7 different types as I, O and Z
+import exponent_board as eb  # used for the exponents of the tile numbers
+
+
+# the shapes of the 7 tetromino types (I, O, Z, J, L, S and T) in their initial
+# rotation states given as the size n of the tile matrix (n = number of rows =
+# number of columns) and the occupied cells as (column_index, row_index)
+SHAPES = {
+    'I': (4, ((1, 0), (1, 1), (1, 2), (1, 3))),
+    'O': (2, ((0, 0), (1, 0), (0, 1), (1, 1))),
+    'Z': (3, ((0, 1), (1, 1), (1, 2), (2, 2))),
+    'J': (3, ((1, 0), (1, 1), (1, 2), (0, 2))),
+    'L': (3, ((1, 0), (1, 1), (1, 2), (2, 2))),
+    'S': (3, ((1, 0), (1, 1), (0, 1), (2, 0))),
+    'T': (3, ((0, 1), (1, 1), (1, 2), (2, 1))),
+}
+
+
+# A class for modeling one rotation state of a tetromino type
+class RotationState:
+    # A constructor that creates a rotation state from the size n of the tile
+    # matrix and the occupied cells given as (row_index, column_index)
+    def __init__(self, n, cells):
+        self.n = n
+        # the occupied cells of the tile matrix (the order of the cells is kept
+        # by the rotations, so the i-th cell always holds the same tile)
+        self.cells = tuple(cells)
+        # the positions of the occupied cells relative to the bottom left cell
+        # of the tile matrix as (dx, dy)
+        self.offsets = tuple((col, (n - 1) - row) for row, col in self.cells)
+        # the occupied cells of each row relative to the bottom left cell as a
+        # bitmask of the dx values (bit dx is set), given as (dy, mask) pairs
+        row_masks = {}
+        for dx, dy in self.offsets:
+            row_masks[dy] = row_masks.get(dy, 0) | (1 << dx)
+        self.row_masks = tuple(sorted(row_masks.items()))
+        # the extents of the occupied cells relative to the bottom left cell
+        self.min_dx = min(dx for dx, dy in self.offsets)
+        self.max_dx = max(dx for dx, dy in self.offsets)
+        self.min_dy = min(dy for dx, dy in self.offsets)
+        self.max_dy = max(dy for dx, dy in self.offsets)
+        # the bottommost occupied cell of each column as (dx, dy) pairs
+        bottoms = {}
+        for dx, dy in self.offsets:
+            bottoms[dx] = min(dy, bottoms.get(dx, dy))
+        self.bottoms = tuple(sorted(bottoms.items()))
+
+
+# A function that builds the four rotation states of each tetromino type
+def build_rotation_table():
+    table = {}
+    for shape, (n, occupied_cells) in SHAPES.items():
+        cells = [(row, col) for col, row in occupied_cells]
+        states = []
+        for rotation in range(4):
+            states.append(RotationState(n, cells))
+            # a clockwise rotation moves the cell (row, col) to (col, n - 1 - row)
+            cells = [(col, n - 1 - row) for row, col in cells]
+        table[shape] = tuple(states)
+    return table
+
+
+# the rotation states of all the tetromino types built once at import, where
+# ROTATIONS[shape][k] is the state after k clockwise rotations
+ROTATIONS = build_rotation_table()
+
+
+# A class for modeling tetrominoes with 7 different types as I, O, Z, J, L, S and T
 class Tetromino:
     # the dimensions of the game grid (defined as class variables)
     grid_height, grid_width = None, None
 
-    # A constructor for creating a tetromino with a given shape (type)
-    def __init__(self, shape):
+    # A constructor for creating a tetromino with a given shape (type), using
+    # the given random number generator (e.g. the random.Random owned by a
+    # game) for its tile numbers and its horizontal position
+    def __init__(self, shape, rng=random):
         self.type = shape  # set the type of this tetromino
-
-        # determine the occupied (non-empty) cells in the tile matrix based on
-        # the shape of this tetromino (see the documentation given with this code)
-        occupied_cells = []
-        if self.type == 'I':
-            n = 4  # n = number of rows = number of columns in the tile matrix
-            # shape of the tetromino I in its initial rotation state
-            occupied_cells.append((1, 0))  # (column_index, row_index)
-            occupied_cells.append((1, 1))
-            occupied_cells.append((1, 2))
-            occupied_cells.append((1, 3))
-        elif self.type == 'O':
-            n = 2  # n = number of rows = number of columns in the tile matrix
-            # shape of the tetromino O in its initial rotation state
-            occupied_cells.append((0, 0))  # (column_index, row_index)
-            occupied_cells.append((1, 0))
-            occupied_cells.append((0, 1))
-            occupied_cells.append((1, 1))
-        elif self.type == 'Z':
-            n = 3  # n = number of rows = number of columns in the tile matrix
-            # shape of the tetromino Z in its initial rotation state
-            occupied_cells.append((0, 1))  # (column_index, row_index)
-            occupied_cells.append((1, 1))
-            occupied_cells.append((1, 2))
-            occupied_cells.append((2, 2))
-        elif self.type == 'J':
-            n = 3  # n = number of rows = number of columns in the tile matrix
-            # shape of the tetromino J in its initial rotation state
-            occupied_cells.append((1, 0))
-            occupied_cells.append((1, 1))
-            occupied_cells.append((1, 2))
-            occupied_cells.append((0, 2))
-        elif self.type == 'L':
-            n = 3  # n = number of rows = number of columns in the tile matrix
-            # shape of the tetromino L in its initial rotation state
-            occupied_cells.append((1, 0))  # (column_index, row_index)
-            occupied_cells.append((1, 1))
-            occupied_cells.append((1, 2))
-            occupied_cells.append((2, 2))
-        elif self.type == 'S':
-            n = 3  # n = number of rows = number of columns in the tile matrix
-            # shape of the tetromino S in its initial rotation state
-            occupied_cells.append((1, 0))  # (column_index, row_index)
-            occupied_cells.append((1, 1))
-            occupied_cells.append((0, 1))
-            occupied_cells.append((2, 0))
-        elif self.type == 'T':
-            n = 3  # n = number of rows = number of columns in the tile matrix
-            # shape of the tetromino T in its initial rotation state
-            occupied_cells.append((0, 1))  # (column_index, row_index)
-            occupied_cells.append((1, 1))
-            occupied_cells.append((1, 2))
-            occupied_cells.append((2, 1))
-        # create a matrix of numbered tiles based on the shape of this tetromino
-        self.tile_matrix = np.full((n, n), None)
-        # create the four tiles (minos) of this tetromino and place these tiles
-        # into the tile matrix
-        for i in range(len(occupied_cells)):
-            col_index, row_index = occupied_cells[i][0], occupied_cells[i][1]
-            # create a tile for each occupied cell of this tetromino
-            new_tile = Tile()
-            self.tile_matrix[row_index][col_index] = new_tile
+        # the number of clockwise rotations applied to this tetromino (mod 4)
+        self.rotation = 0
+        # look up the occupied (non-empty) cells in the tile matrix of this
+        # tetromino in its initial rotation state
+        state = ROTATIONS[shape][0]
+        n = state.n  # n = number of rows = number of columns in the tile matrix
+        # create the four numbered tiles (minos) of this tetromino, where the
+        # i-th tile is on the i-th cell of each rotation state (a rotation only
+        # changes the rotation state, see rotate_clockwise)
+        self.tiles = [Tile(rng=rng) for cell in state.cells]
         # initialize the position of this tetromino (as the bottom left cell in
         # the tile matrix) with a random horizontal position above the game grid
         self.bottom_left_cell = Point()
         self.bottom_left_cell.y = Tetromino.grid_height - 1
-        self.bottom_left_cell.x = random.randint(0, Tetromino.grid_width - n)
+        self.bottom_left_cell.x = rng.randint(0, Tetromino.grid_width - n)
 
     # A method that computes and returns the position of the cell in the tile
     # matrix specified by the given row and column indexes
     def get_cell_position(self, row, col):
-        n = len(self.tile_matrix)  # n = number of rows = number of columns
+        n = ROTATIONS[self.type][self.rotation].n  # the size of the tile matrix
         position = Point()
         # horizontal position of the cell
         position.x = self.bottom_left_cell.x + col
@@ -93,31 +107,33 @@ class Tetromino:
         position.y = self.bottom_left_cell.y + (n - 1) - row
         return position
 
+    # A method that returns the exponents (log2) of the numbers on the tiles of
+    # this tetromino in the order of the cells of its rotation states (the i-th
+    # cell holds the same tile in every rotation state)
+    def get_tile_exponents(self):
+        return [eb.exponent_of(tile.number) for tile in self.tiles]
+
+    # A method for setting the rotation state, the tile numbers (given as the
+    # exponents in the order of the cells, see get_tile_exponents) and the
+    # position of this tetromino (used for restoring a saved game)
+    def set_state(self, rotation, exponents, x, y):
+        self.rotation = rotation
+        self.tiles = [Tile(eb.number_of(exponent)) for exponent in exponents]
+        self.bottom_left_cell.x, self.bottom_left_cell.y = x, y
+
     # A method to return a copy of the tile matrix without any empty row/column,
     # and the position of the bottom left cell when return_position is set
     def get_min_bounded_tile_matrix(self, return_position=False):
-        n = len(self.tile_matrix)  # n = number of rows = number of columns
+        state = ROTATIONS[self.type][self.rotation]
+        n = state.n  # n = number of rows = number of columns
         # determine rows and columns to copy (omit empty rows and columns)
-        min_row, max_row, min_col, max_col = n - 1, 0, n - 1, 0
-        for row in range(n):
-            for col in range(n):
-                if self.tile_matrix[row][col] is not None:
-                    if row < min_row:
-                        min_row = row
-                    if row > max_row:
-                        max_row = row
-                    if col < min_col:
-                        min_col = col
-                    if col > max_col:
-                        max_col = col
-        # copy the tiles from the tile matrix of this tetromino
+        rows = [row for row, col in state.cells]
+        cols = [col for row, col in state.cells]
+        min_row, max_row, min_col, max_col = min(rows), max(rows), min(cols), max(cols)
+        # copy the tiles of this tetromino onto their cells
         copy = np.full((max_row - min_row + 1, max_col - min_col + 1), None)
-        for row in range(min_row, max_row + 1):
-            for col in range(min_col, max_col + 1):
-                if self.tile_matrix[row][col] is not None:
-                    row_ind = row - min_row
-                    col_ind = col - min_col
-                    copy[row_ind][col_ind] = cp.deepcopy(self.tile_matrix[row][col])
+        for (row, col), tile in zip(state.cells, self.tiles):
+            copy[row - min_row][col - min_col] = cp.deepcopy(tile)
         # return just the matrix copy when return_position is not set (as True)
         # the argument return_position defaults to False when a value is not given
         if not return_position:
@@ -130,16 +146,13 @@ class Tetromino:
 
     # A method for drawing the tetromino on the game grid
     def draw(self):
-        n = len(self.tile_matrix)  # n = number of rows = number of columns
-        for row in range(n):
-            for col in range(n):
-                # draw each occupied cell as a tile on the game grid
-                if self.tile_matrix[row][col] is not None:
-                    # get the position of the tile
-                    position = self.get_cell_position(row, col)
-                    # draw only the tiles that are inside the game grid
-                    if position.y < Tetromino.grid_height:
-                        self.tile_matrix[row][col].draw(position)
+        state = ROTATIONS[self.type][self.rotation]
+        x, y = self.bottom_left_cell.x, self.bottom_left_cell.y
+        # draw each tile on its cell of the current rotation state
+        for (dx, dy), tile in zip(state.offsets, self.tiles):
+            # draw only the tiles that are inside the game grid
+            if y + dy < Tetromino.grid_height:
+                tile.draw(Point(x + dx, y + dy))
 
     # A method for moving this tetromino in a given direction by 1 on the grid
     def move(self, direction, game_grid, hard_drop):
@@ -154,107 +167,49 @@ class Tetromino:
             self.bottom_left_cell.x += 1
         # hard drop condition
         elif direction == "h":
-            # hard dropping the tile
-            while self.move("down", game_grid, hard_drop=True):
-                pass  # Continuously move down until the tetromino cannot move further
+            # hard dropping the tile directly to its landing position
+            self.bottom_left_cell.y = self.get_landing_position(game_grid).y
             return True
         else:  # direction == "down"
             self.bottom_left_cell.y -= 1
         return True  # a successful move in the given direction
 
+    # A method that returns the position of the bottom left cell of this
+    # tetromino after dropping it down as far as possible (e.g. for a hard drop
+    # or for drawing a ghost piece)
+    def get_landing_position(self, game_grid):
+        state = ROTATIONS[self.type][self.rotation]
+        x, y = self.bottom_left_cell.x, self.bottom_left_cell.y
+        return Point(x, game_grid.get_landing_y(state, x, y))
+
     # A method to check is the tetromino can be moved
     def can_be_moved(self, direction, game_grid, hard_drop=False):
-        n = len(self.tile_matrix)  # n = number of rows = number of columns
-
-        # Check if hard drop is requested
-        if hard_drop:
-            for row in range(n - 1, -1, -1):
-                for col in range(n):
-                    if self.tile_matrix[row][col] is not None:
-                        bottommost = self.get_cell_position(row, col)
-                        if bottommost.y == 0:
-                            return False  # Tetromino cannot be hard-dropped
-                        if game_grid.is_occupied(bottommost.y - 1, bottommost.x):
-                            return False  # Tetromino cannot be hard-dropped
-            return True  # Tetromino can be hard-dropped
-
-        # check for moving left or right
-        if direction == "left" or direction == "right":
-            for row_index in range(n):
-                for col_index in range(n):
-                    # check the leftmost tile of each row
-                    row, col = row_index, col_index
-                    if direction == "left" and self.tile_matrix[row][col] is not None:
-                        # the position of the leftmost tile of the current row
-                        leftmost = self.get_cell_position(row, col)
-                        # if any leftmost tile is at x = 0
-                        if leftmost.x == 0:
-                            return False  # this tetromino cannot be moved left
-                        # if the grid cell on the left of a leftmost tile is occupied
-                        if game_grid.is_occupied(leftmost.y, leftmost.x - 1):
-                            return False  # this tetromino cannot be moved left
-                        # as the leftmost tile of the current row is checked
-                        break  # end the inner for loop
-                    # check the rightmost tile of each row
-                    row, col = row_index, n - 1 - col_index
-                    if direction == "right" and self.tile_matrix[row][col] is not None:
-                        # the position of the rightmost tile of the current row
-                        rightmost = self.get_cell_position(row, col)
-                        # if any rightmost tile is at x = grid_width - 1
-                        if rightmost.x == Tetromino.grid_width - 1:
-                            return False  # this tetromino cannot be moved right
-                        # if the grid cell on the right of a rightmost tile is occupied
-                        if game_grid.is_occupied(rightmost.y, rightmost.x + 1):
-                            return False  # this tetromino cannot be moved right
-                        # as the rightmost tile of the current row is checked
-                        break  # end the inner for loop
-        # check the bottommost tile of each column
-        elif direction == "down":
-            for col in range(n):
-                for row in range(n - 1, -1, -1):
-                    # if the current cell of the tetromino is occupied by a tile
-                    if self.tile_matrix[row][col] is not None:
-                        # the position of the bottommost tile of the current col
-                        bottommost = self.get_cell_position(row, col)
-                        # if any bottommost tile is at y = 0
-                        if bottommost.y == 0:
-                            return False  # this tetromino cannot be moved down
-                        # if the grid cell below any bottommost tile is occupied
-                        if game_grid.is_occupied(bottommost.y - 1, bottommost.x):
-                            return False  # this tetromino cannot be moved down
-                        # as the bottommost tile of the current row is checked
-                        break  # end the inner for loop
-        # if this method does not end by returning False before this line
-        return True  # this tetromino can be moved in the given direction
+        state = ROTATIONS[self.type][self.rotation]
+        x, y = self.bottom_left_cell.x, self.bottom_left_cell.y
+        # the position of the bottom left cell after the move (a hard drop is
+        # checked one row at a time as moving down)
+        if direction == "left":
+            x -= 1
+        elif direction == "right":
+            x += 1
+        else:  # direction == "down" or a hard drop
+            y -= 1
+        # test the shifted rows of the tetromino against the grid row bitmasks
+        return game_grid.can_place(state, x, y)
 
     # A method to check if the tetromino can be rotated
     def can_be_rotated(self, game_grid):
-        # Create a copy of the tile matrix
-        temp_tile_matrix = np.copy(self.tile_matrix)
-
-        # Rotate the copied matrix
-        rotated_matrix = np.rot90(temp_tile_matrix)
-
-        # Check if the rotated position is valid
-        for row in range(len(rotated_matrix)):
-            for col in range(len(rotated_matrix)):
-                if rotated_matrix[row][col] is not None:
-                    # Get the position of the cell after rotation
-                    position = self.get_cell_position(row, col)
-                    # Check if the rotated position is within the game grid and not occupied
-                    if position.x < 0 or position.x >= Tetromino.grid_width \
-                            or position.y < 0 or position.y >= Tetromino.grid_height \
-                            or game_grid.is_occupied(position.y, position.x):
-                        return False  # Rotation is not possible
-
-        return True  # Rotation is possible
+        # look up the rotation state after a clockwise rotation
+        state = ROTATIONS[self.type][(self.rotation + 1) % 4]
+        x, y = self.bottom_left_cell.x, self.bottom_left_cell.y
+        # the rotated tetromino must be completely inside the game grid
+        if y + state.max_dy >= Tetromino.grid_height:
+            return False  # Rotation is not possible
+        return game_grid.can_place(state, x, y)
 
     # A method to rotate to tetromino clockwise
     def rotate_clockwise(self, grid):
+        # the tiles keep their cells as the cells of the rotation states are in
+        # the same order, so only the rotation state changes
         if (self.can_be_rotated(grid)):
-            n = len(self.tile_matrix)  # n = number of rows = number of columns
-            rotated_matrix = np.full((n, n), None)  # create a new matrix for rotated tiles
-            for row in range(n):
-                for col in range(n):
-                    rotated_matrix[col][n - 1 - row] = self.tile_matrix[row][col]
-            self.tile_matrix = rotated_matrix
\ No newline at end of file
+            self.rotation = (self.rotation + 1) % 4
\ No newline at end of file
@@ -1,10 +1,26 @@
-import lib.stddraw as stddraw  # used for drawing the tiles to display them
-from lib.color import Color  # used for coloring the tiles
+import palette  # the colors of the tiles by their values
+import exponent_board as eb  # the exponents of the tile numbers
 import random
 
+# the lib.stddraw module once it is imported (see get_stddraw)
+_stddraw = None
 
-# A class for modeling numbered tiles as in 2048
+
+# A function that returns the lib.stddraw module, which is imported (and so
+# pygame is initialized) only when something is drawn for the first time so
+# that the game rules can also run headless (see the engine module)
+def get_stddraw():
+    global _stddraw
+    if _stddraw is None:
+        import lib.stddraw as stddraw
+        _stddraw = stddraw
+    return _stddraw
+
+# A class for modeling numbered tiles as in 2048 (a tile stores only its number
+# and uses the shared colors of its number unless its colors are changed)
 class Tile:
+    # the attributes of each Tile object (no per-instance __dict__)
+    __slots__ = ('number', '_colors')
     # Class variables shared among all Tile objects
     # ---------------------------------------------------------------------------
     # the value of the boundary thickness (for the boxes around the tiles)
@@ -12,41 +28,85 @@ class Tile:
     # font family and font size used for displaying the tile number
     font_family, font_size = "Arial", 15
 
-    # A constructor that creates a tile with 2 as the number on it
-    def __init__(self):
+    # A constructor that creates a tile with the given number on it (or with 2
+    # or 4 chosen randomly with the given random number generator when the
+    # number is not given)
+    def __init__(self, number=None, rng=random):
         # set the number on this tile randomly to the 2 or 4
-        self.number = random.choice([2, 4])
-        # set the colors of this tile
-        if self.number == 2:
-            # if the number is 2, adjust the background
-            self.background_color = Color(238, 228, 218)
-        else:
-            # if the number is 4, adjust the background
-            self.background_color = Color(236, 224, 200)
+        if number is None:
+            number = rng.choice([2, 4])
+        self.number = number
+        # the colors of this tile (None for the shared colors of its number)
+        self._colors = None
+
+    # the (background, foreground, box) colors of this tile (see palette)
+    @property
+    def colors(self):
+        if self._colors is None:
+            return palette.get_entry(self.number)
+        return self._colors
+
+    # the background color of this tile
+    @property
+    def background_color(self):
+        return self.colors[0]
 
-        self.foreground_color = Color(0, 0, 0)  # foreground (number) color
-        self.box_color = Color(141, 131, 121)  # box (boundary) color
+    # the foreground (number) color of this tile
+    @property
+    def foreground_color(self):
+        return self.colors[1]
+
+    # the box (boundary) color of this tile
+    @property
+    def box_color(self):
+        return self.colors[2]
+
+    # a method to update the background and foreground colors of this tile
+    # based on its number (back to the shared colors of its number)
+    def update_colors(self):
+        self._colors = None
 
     # a method to change color of the background
     def set_background_color(self, color):
-        self.background_color = color
+        self._colors = self.colors._replace(background=color)
 
     # a method to change color of the foreground
     def set_foreground_color(self, color):
-        self.foreground_color = color
+        self._colors = self.colors._replace(foreground=color)
 
     # A method for drawing this tile at a given position with a given length
+    # (the tile is drawn as a sprite that is rendered once for each number and
+    # size, see render)
     def draw(self, position, length=1):  # length defaults to 1
-        # draw the tile as a filled square
-        stddraw.setPenColor(self.background_color)
-        stddraw.filledSquare(position.x, position.y, length / 2)
-        # draw the bounding box around the tile as a square
-        stddraw.setPenColor(self.box_color)
-        stddraw.setPenRadius(Tile.boundary_thickness)
-        stddraw.square(position.x, position.y, length / 2)
-        stddraw.setPenRadius()  # reset the pen radius to its default value
-        # draw the number on the tile
-        stddraw.setPenColor(self.foreground_color)
-        stddraw.setFontFamily(Tile.font_family)
-        stddraw.setFontSize(Tile.font_size)
-        stddraw.text(position.x, position.y, str(self.number))
\ No newline at end of file
+        stddraw = get_stddraw()
+        # the tiles with changed colors do not share the sprite of their number
+        if self._colors is None:
+            key = ("tile", self.number)
+        else:
+            key = ("tile", self.number, self._colors)
+        stddraw.drawSprite(position.x, position.y, length, length, key,
+                           self.render)
+
+    # A method that renders this tile as a pygame surface on which the tile is
+    # drawn at (x, y) with the given size in pixels (see stddraw.drawSprite):
+    # a filled square with a box around it and the number on it
+    def render(self, x, y, width, height):
+        import pygame  # imported only when drawing (see get_stddraw)
+        stddraw = get_stddraw()
+        if self._colors is None:
+            colors = palette.get_pygame_entry(eb.exponent_of(self.number))
+        else:
+            colors = palette.convert_entry(self._colors)
+        background_color, foreground_color, box_color = colors
+        # the pixels of the tile as stddraw.filledSquare would cover them
+        rect = pygame.Rect(x, y, width, height)
+        sprite = pygame.Surface((rect.right, rect.bottom))
+        sprite.fill(background_color)
+        # the box has the width of a line drawn with boundary_thickness
+        box_width = stddraw.getPenWidth(Tile.boundary_thickness)
+        pygame.draw.rect(sprite, box_color, rect, box_width)
+        font = stddraw.getFont(Tile.font_family, Tile.font_size)
+        text = font.render(str(self.number), 1, foreground_color)
+        sprite.blit(text, text.get_rect(center=(x + width / 2.0,
+                                                y + height / 2.0)))
+        return sprite
@@ -0,0 +1,78 @@
+################################################################################
+#                                                                              #
+# Zobrist hashing of the boards of Tetris 2048                                 #
+#                                                                              #
+################################################################################
+from functools import lru_cache  # used for creating the keys once per grid size
+import numpy as np  # fundamental Python module for scientific computing
+import exponent_board as eb  # the compact board representation
+
+# the seed of the random keys (fixed so that the hashes are the same in every
+# process and every run)
+SEED = 2048
+
+
+# A function that returns the random 64-bit keys of a board with the given size
+# as a (grid_h, grid_w, N_EXPONENTS) array where keys[row, col, exponent] is the
+# key of a tile with that exponent in that cell. The keys of exponent 0 (empty
+# cells) are 0 so that empty cells do not change the hash.
+@lru_cache(maxsize=None)
+def board_keys(grid_h, grid_w):
+    rng = np.random.default_rng(SEED)
+    keys = rng.integers(np.iinfo(np.uint64).max, size=(grid_h, grid_w, eb.N_EXPONENTS),
+                        dtype=np.uint64, endpoint=True)
+    keys[:, :, 0] = 0
+    keys.flags.writeable = False
+    return keys
+
+
+# A function that returns the Zobrist hash of a board (the xor of the keys of
+# all its tiles) as a 64-bit integer
+def hash_board(board):
+    grid_h, grid_w = board.shape
+    keys = board_keys(grid_h, grid_w)
+    tile_keys = keys[np.arange(grid_h)[:, None], np.arange(grid_w), board]
+    return int(np.bitwise_xor.reduce(tile_keys, axis=None))
+
+
+# A function that returns the Zobrist hashes of a stack of boards given as a
+# (k, h, w) array (an array of k uint64 values)
+def hash_boards(boards):
+    k, grid_h, grid_w = boards.shape
+    keys = board_keys(grid_h, grid_w)
+    tile_keys = keys[np.arange(grid_h)[:, None], np.arange(grid_w), boards]
+    return np.bitwise_xor.reduce(tile_keys.reshape(k, -1), axis=1)
+
+
+# the types of the tetrominoes in the order of their keys (see piece_keys)
+PIECE_TYPES = ('I', 'O', 'Z', 'J', 'L', 'S', 'T')
+# the slots of the tetrominoes in the hash of a game grid
+CURRENT, NEXT = 0, 1
+
+
+# A function that returns the random 64-bit keys of the tetrominoes as a pair of
+# arrays: the keys of the types with shape (2, 7) and the keys of the tiles with
+# shape (2, 4, N_EXPONENTS), both indexed by the slot (CURRENT or NEXT) first
+@lru_cache(maxsize=None)
+def piece_keys():
+    rng = np.random.default_rng(SEED + 1)
+    high = np.iinfo(np.uint64).max
+    type_keys = rng.integers(high, size=(2, len(PIECE_TYPES)), dtype=np.uint64,
+                             endpoint=True)
+    tile_keys = rng.integers(high, size=(2, 4, eb.N_EXPONENTS), dtype=np.uint64,
+                             endpoint=True)
+    type_keys.flags.writeable = False
+    tile_keys.flags.writeable = False
+    return type_keys, tile_keys
+
+
+# A function that returns the key of a tetromino with the given type and tile
+# exponents (in the order of the cells, see Tetromino.get_tile_exponents) in
+# the given slot (CURRENT or NEXT) as a 64-bit integer. The key depends only on
+# the tetromino, not on its position or rotation state.
+def piece_key(slot, shape, exponents):
+    type_keys, tile_keys = piece_keys()
+    key = int(type_keys[slot, PIECE_TYPES.index(shape)])
+    for cell, exponent in enumerate(exponents):
+        key ^= int(tile_keys[slot, cell, exponent])
+    return key